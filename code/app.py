@@ -0,0 +1,948 @@
+"""
+This module contains the main code for the Measurement Fox project.
+It initializes the LCD display and rotary encoders, and provides functions
+for handling user input and displaying information on the LCD. main.py
+starts it, so that it can be precompiled like the other modules.
+"""
+
+import utime
+_boot_us = utime.ticks_us() # before the other imports, so that they are timed
+
+from array import array
+from machine import I2C, Pin
+from pico_i2c_lcd import I2cLcd, GC_LOW_MEM
+from lcd_framebuffer import LcdFrameBuffer
+from lcd_queue import LcdQueue
+from rotary_irq_rp2 import RotaryIRQ
+from rotary_bank import RotaryBank
+from speed import SpeedEstimator, combined_speed
+from distance import DistanceAccumulator
+from fixed_field import FixedField, ALIGN_RIGHT
+from big_digits import BigDigits
+from odometer import Odometer
+from recorder import Recorder
+from odometry import DifferentialOdometry
+from button import Button, CLICK, DOUBLE_CLICK, LONG_PRESS
+from logger import Logger, INFO
+
+# Constants
+I2C_ADDR = 0x27
+I2C_NUM_ROWS = 2
+I2C_NUM_COLS = 16
+PIN_SDA = 26
+PIN_SCL = 27
+PIN_R2_CLK = 15
+PIN_R2_DT = 14
+PIN_R1_CLK = 16
+PIN_R1_DT = 17
+PIN_BUTTON = 7
+SLEEP_TIME = 50  # in ms
+MODE_HOLD_TIME = 1000 # in ms
+DISTANCE_NUM = 4900000 # micrometres pushed per DISTANCE_DEN encoder steps
+DISTANCE_DEN = 468
+LCD_UPDATE = 10 # update display every n loop
+LCD_GC_THRESHOLD = 8192 # collect garbage in the LCD driver below this many free bytes
+LCD_QUEUE = False # queue the LCD writes and send them from a timer (a task in the async runtime) instead of waiting for the bus
+SHOW_SPEED = True # show the push speed on the first line
+SPEED_FIELD = FixedField(6, ((10, 2, b" m/s "),), align=ALIGN_RIGHT, plus=0) # from mm/s
+SPEED_LOG_SIZE = 32 # encoder steps buffered between speed updates
+DISTANCE_FIELD = FixedField(7, ((10000, 2, b" meters"),   # from micrometres
+                               (100000, 4, b" km"),    # km always six characters,
+                               (1000000, 3, b" km"),   # one space before the unit
+                               (10000000, 2, b" km"),
+                               (100000000, 1, b" km")))
+BIG_DISTANCE = False # show the distance in two row digits instead of the speed and distance
+BIG_DISTANCE_FIELD = FixedField(5, ((10000, 2, b"m"), (100000, 1, b"m"), # at most four digits
+                                    (1000000, 3, b"km"), (10000000, 2, b"km"),
+                                    (100000000, 1, b"km")),
+                                align=ALIGN_RIGHT, plus=0)
+ODOMETER_FILE = "odo" # prefix of the odometer log files, None to not persist the distance
+ODOMETER_SAVE_METRES = 1 # save the distance right away after this many meters
+ODOMETER_INTERVAL = 10000 # in ms, smaller changes are saved after this long
+DIFFERENTIAL = 3 # wheel mode that tracks the path and heading of both wheels
+WHEEL_MODES = 4
+TRACK_WIDTH_UM = 250000 # distance between the wheels, in micrometres
+PATH_FIELD = FixedField(8, ((10000, 2, b" m"), (1000000, 3, b" km")),
+                        align=ALIGN_RIGHT, plus=0)
+DISPLACEMENT_FIELD = FixedField(6, ((10000, 2, b"m"), (1000000, 2, b"km")),
+                                align=ALIGN_RIGHT, plus=0)
+HEADING_FIELD = FixedField(3, ((1, 0, b"\xdf"),), align=ALIGN_RIGHT, plus=0) # degree sign
+RECORDER_FILE = "session" # prefix of the session recordings, None to disable recording
+SPLASH_TIME = 2000 # in ms, the welcome screen is shown this long unless the wheels move
+BOOT_PROFILE = True # print how long each boot phase took
+ENCODER_STATS = False # count edges, bounce and IRQ time of the encoders, shown on a menu page after the last mode
+DIAGNOSTICS_FORMAT = "{}{:4d}!{:5d}/s{:3d}" # wheel, aborted steps, peak edges/s, max IRQ us
+LOG_LEVEL = INFO # OFF, ERROR, WARNING, INFO or DEBUG (the encoder values on every change)
+LOG_FLUSH_MS = 100 # the log is written from a timer (a task in the async runtime) this often
+LOG_VALUES_MS = 500 # at most one log of the encoder values this often
+
+# Buffered log, written in the background instead of blocking on USB
+log = Logger(LOG_LEVEL)
+log.limit("Values = {}, {}", LOG_VALUES_MS)
+log.limit("Result = {}", LOG_VALUES_MS)
+RUNTIME = "async" # "async" for the event driven runtime, "dual" for the two core one, "poll" for main()
+
+def init_lcd(sda_pin, scl_pin):
+    '''
+    Initialization for LCD display.
+    Parameters:
+    sda_pin
+    scl_pin
+
+    Return:
+    lcd object
+    '''
+    i2c = I2C(1, sda=Pin(sda_pin), scl=Pin(scl_pin), freq=400000)
+    # The LCD was powered with the Pico, so booting counts as power-up time
+    lcd = I2cLcd(i2c, I2C_ADDR, I2C_NUM_ROWS, I2C_NUM_COLS,
+                 gc_policy=GC_LOW_MEM, gc_threshold=LCD_GC_THRESHOLD,
+                 powered_ms=utime.ticks_diff(utime.ticks_us(), _boot_us) // 1000)
+    lcd.putstr("Welcome to Measurement Fox <3")
+    return lcd
+
+def init_framebuffer(sda_pin, scl_pin, timer=True):
+    '''
+    Initialization for the LCD framebuffer the readouts are drawn into,
+    through an LcdQueue if LCD_QUEUE is set.
+    Parameters:
+    sda_pin
+    scl_pin
+    timer: drain the queue from a machine.Timer, False if the caller
+    drains it
+
+    Return:
+    LcdFrameBuffer object
+    '''
+    lcd = init_lcd(sda_pin, scl_pin)
+    if LCD_QUEUE:
+        lcd = LcdQueue(lcd)
+        if timer:
+            lcd.start_timer()
+    return LcdFrameBuffer(lcd)
+
+def init_rotaries(hard_irq=False):
+    '''
+    Initialization for the rotary encoders of both wheels.
+    Parameters:
+    hard_irq: decode in hard IRQs instead of scheduled ones
+
+    Return:
+    instance of RotaryBank, with the RotaryIRQ of each wheel in rotaries
+    '''
+    bank = RotaryBank(((Pin(PIN_R1_CLK), Pin(PIN_R1_DT)),
+                       (Pin(PIN_R2_CLK), Pin(PIN_R2_DT))),
+                      pull_up=True,
+                      range_mode=RotaryIRQ.RANGE_UNBOUNDED,
+                      edge_log_size=SPEED_LOG_SIZE,
+                      hard_irq=hard_irq)
+    if ENCODER_STATS:
+        bank.enable_stats()
+    return bank
+
+def use_rotaries(state, bank):
+    '''
+    Makes bank the encoders read by read_encoders().
+    Parameters:
+    state: the state dictionary
+    bank: instance of RotaryBank
+
+    Return:
+    bank
+    '''
+    state["bank"] = bank
+    state["values"] = array('i', bytes(4 * len(bank)))
+    return bank
+
+def init_button(pin):
+    '''
+    Initialization for the push button.
+    Parameters:
+    pin
+
+    Return:
+    instance of Button
+    '''
+    return Button(Pin(pin, Pin.IN, Pin.PULL_UP), long_press_ms=MODE_HOLD_TIME)
+
+def init_odometer(state):
+    '''
+    Opens the odometer log and restores the saved distance and wheel mode.
+    Parameters:
+    state
+
+    Return:
+    instance of Odometer, or None if ODOMETER_FILE is None
+    '''
+    if ODOMETER_FILE is None:
+        return None
+    min_half_ticks = ODOMETER_SAVE_METRES * 2000000 * DISTANCE_DEN // DISTANCE_NUM
+    odometer = Odometer(ODOMETER_FILE, min_half_ticks, ODOMETER_INTERVAL)
+    saved = odometer.recover()
+    if saved is not None:
+        half_ticks, state["wheel_mode"] = saved
+        state["distance"].add(half_ticks)
+    return odometer
+
+def init_recorder():
+    '''
+    Initialization for the session recorder.
+    No parameters.
+
+    Return:
+    instance of Recorder, or None if RECORDER_FILE is None
+    '''
+    if RECORDER_FILE is None:
+        return None
+    return Recorder(RECORDER_FILE)
+
+def main():
+    '''
+    Main function where the program loops.
+    No parameters.
+    No return  values.
+    '''
+    lcd, r1, r2, button, state = setup()
+
+    while True:
+        loop_step(lcd, r1, r2, button, state)
+        utime.sleep_ms(button.wait_ms(SLEEP_TIME))
+
+def init_state():
+    '''
+    Creates the state shared by the main loop and the menu.
+    No parameters.
+
+    Return:
+    state dictionary
+    '''
+    return {
+    "wheel_mode": 0, # 0 both, 1 left, 2 right, 3 differential
+    "distance": DistanceAccumulator(DISTANCE_NUM, DISTANCE_DEN),
+    "val_old1": 0,
+    "val_old2": 0,
+    "result": 0,
+    "i": 0,
+    "should_update": False,
+    "speed1": SpeedEstimator(),
+    "speed2": SpeedEstimator(),
+    "odometry": DifferentialOdometry(TRACK_WIDTH_UM, DISTANCE_NUM, DISTANCE_DEN),
+    "odometer": None,
+    "recorder": None,
+    "splash_until": None,
+    "diagnostics": False, # the menu shows the encoder diagnostics
+    "stats": None, # where the diagnostics come from: rotaries with stats() and reset_stats()
+    "bank": None, # the RotaryBank of the encoders, see use_rotaries()
+    "values": None # encoder values read by read_encoders(), one per encoder
+    }
+
+_boot_timeline = []
+
+def boot_mark(phase):
+    '''
+    Ends a boot phase for the boot timeline.
+    Parameters:
+    phase: name of the phase
+
+    Return:
+    None
+    '''
+    _boot_timeline.append((phase, utime.ticks_us()))
+
+def print_boot_timeline():
+    '''
+    Prints how long each boot phase took, starting from the import of
+    this module.
+    No parameters.
+
+    Return:
+    None
+    '''
+    last = _boot_us
+    for phase, ticks in _boot_timeline:
+        print(f"boot {phase:10s} {utime.ticks_diff(ticks, last) / 1000:7.1f} ms")
+        last = ticks
+    print(f"boot {'total':10s} {utime.ticks_diff(last, _boot_us) / 1000:7.1f} ms")
+
+def setup(lcd_timer=True):
+    '''
+    Initializes the hardware and shows the welcome screen. The encoders
+    are started first so that no early motion is lost, and the welcome
+    screen stays up while the main loop already runs, see end_splash().
+    Parameters:
+    lcd_timer: passed to init_framebuffer(), and whether the log is
+    written from a timer; the async runtime runs tasks instead
+
+    Return:
+    (lcd, r1, r2, button, state) for loop_step
+    '''
+    boot_mark("imports")
+    state = init_state()
+    bank = state["stats"] = use_rotaries(state, init_rotaries())
+    r1, r2 = bank.rotaries
+    boot_mark("encoders")
+    button = init_button(PIN_BUTTON)
+    state["wheel_mode"] = False
+    state["odometer"] = init_odometer(state)
+    state["recorder"] = init_recorder()
+    enable_rotaries(state)
+    boot_mark("state")
+
+    # Draw through a shadow buffer so refreshes only send changed cells
+    lcd = init_framebuffer(PIN_SDA, PIN_SCL, lcd_timer)
+    if lcd_timer:
+        log.start_timer(LOG_FLUSH_MS)
+    boot_mark("lcd")
+
+    values = read_encoders(state)
+    state["val_old1"], state["val_old2"] = values[0], values[1]
+    state["splash_until"] = utime.ticks_add(utime.ticks_ms(), SPLASH_TIME)
+    if BOOT_PROFILE:
+        print_boot_timeline()
+
+    return lcd, r1, r2, button, state
+
+def splash_over(state, now=False):
+    '''
+    Checks whether the welcome screen is over, and ends it once SPLASH_TIME
+    has passed.
+    Parameters:
+    state
+    now: end it right away, e.g. because the wheels moved
+
+    Return:
+    True if the welcome screen is over, False while it is shown
+    '''
+    until = state["splash_until"]
+    if until is None:
+        return True
+    if not now and utime.ticks_diff(until, utime.ticks_ms()) > 0:
+        return False
+    state["splash_until"] = None
+    return True
+
+def end_splash(lcd, state, now=False):
+    '''
+    Replaces the welcome screen with the reading when it is over, see
+    splash_over().
+    Parameters:
+    lcd, state, now as for splash_over()
+
+    Return:
+    True if the reading is shown, False while the welcome screen is
+    '''
+    if state["splash_until"] is None:
+        return True
+    if not splash_over(state, now):
+        return False
+    reset_lcd(lcd, calculate_distance(state["result"], state), get_pose(state))
+    return True
+
+def loop_step(lcd, r1, r2, button, state):
+    '''
+    One iteration of the main loop: refreshes the distance and handles
+    the button.
+    Parameters:
+    lcd, r1, r2, button, state as returned by setup()
+
+    Return:
+    None
+    '''
+    values = read_encoders(state)
+    val_new1, val_new2 = values[0], values[1]
+    record_sample(state, val_new1, val_new2)
+    state["speed1"].feed(r1)
+    state["speed2"].feed(r2)
+    differential = state["wheel_mode"] == DIFFERENTIAL
+    if differential:
+        state["odometry"].update(val_new1, val_new2)
+    moved = state["val_old1"] != val_new1 or state["val_old2"] != val_new2
+    showing = end_splash(lcd, state, moved)
+
+    if showing and SHOW_SPEED and not differential and state["i"] % LCD_UPDATE == 0:
+        lcd_update_speed(lcd, calculate_speed(state))
+
+    if showing and (moved or state["should_update"]) and state["i"] % LCD_UPDATE == 0:
+        state["val_old1"], state["val_old2"] = val_new1, val_new2
+
+        state["result"] = calculate_half_ticks(val_new1, val_new2, state)
+
+        log.debug("Values = {}, {}", val_new1, val_new2)
+        log.debug("Result = {}", state["result"])
+        if differential:
+            lcd_update_odometry(lcd, get_pose(state))
+        else:
+            distance = calculate_distance(state["result"], state)
+            lcd_update_distance(lcd, distance)
+
+        state["should_update"] = False
+
+    if state["i"] % LCD_UPDATE == 0:
+        save_distance(state)
+
+    event = button.get()
+    if event is not None:
+        record_event(state, val_new1, val_new2, event)
+
+    if event == LONG_PRESS:
+        log.info("entering menu")
+        disable_rotaries(state)
+        state["distance"].add(state["result"])
+        state["bank"].reset()
+        state["result"] = 0
+        enter_menu(lcd, button, state)
+        enable_rotaries(state)
+        state["speed1"].reset()
+        state["speed2"].reset()
+        state["odometry"].sync(0, 0)
+        save_distance(state, True)
+        log.info("exiting menu")
+        distance = calculate_distance(state["result"], state)
+        reset_lcd(lcd, distance, get_pose(state))
+
+    elif event == CLICK or event == DOUBLE_CLICK:
+        log.info("click")
+
+        state["bank"].reset()
+        state["result"] = 0
+        state["distance"].reset()
+        state["odometry"].reset()
+        state["odometry"].sync(0, 0)
+        reset_lcd(lcd, 0, get_pose(state))
+        state["should_update"] = True
+        save_distance(state, True)
+
+    state["i"] = (state["i"] + 1) % LCD_UPDATE
+
+
+def save_distance(state, now=False):
+    """
+    Saves the distance to the odometer log, if there is one.
+
+    Parameters:
+    state (dict): The state dictionary containing the distance, the result
+    and the odometer.
+    now (bool): Save any change right away instead of batching it.
+
+    Returns:
+    None
+    """
+    odometer = state["odometer"]
+    if odometer is None:
+        return
+    half_ticks = state["distance"].half_ticks + state["result"]
+    if now:
+        odometer.save(half_ticks, state["wheel_mode"])
+    else:
+        odometer.update(half_ticks, state["wheel_mode"])
+
+
+def reset_lcd(lcd, distance, pose=None):
+    """
+    Clears the LCD display and sets the initial text.
+
+    Parameters:
+    lcd (object): The LCD object used for displaying information.
+    distance (int): The distance to show, in micrometres.
+    pose (tuple): (path, displacement, heading) from get_pose() to show
+    instead of the distance in the differential mode.
+
+    Returns:
+    None
+    """
+    lcd.clear()
+    if pose is not None:
+        lcd_put_odometry(lcd, *pose)
+        lcd.flush()
+        return
+    if SHOW_SPEED:
+        lcd_put_speed(lcd, 0)
+    else:
+        lcd.putstr("Distance pushed:")
+    lcd_put_distance(lcd, distance)
+    lcd.flush()
+
+
+def enter_menu(lcd, button, state):
+    """
+    Enters the menu and allows the user to toggle the single wheel mode.
+    A click selects the next mode, a double click starts or stops a
+    session recording, a long press leaves the menu. With ENCODER_STATS,
+    the encoder diagnostics follow the last mode.
+
+    Args:
+        lcd (object): The LCD object used for displaying information.
+        button (Button): The button used for user input.
+        state (dict): State containing the wheel mode.
+
+    Returns:
+        None
+    """
+    state["diagnostics"] = False
+    lcd_put_mode_text(lcd, state)
+
+    while True:
+        event = button.get()
+
+        if event == LONG_PRESS:
+            break
+
+        if event == CLICK:
+            log.info("click in menu")
+
+            menu_next(state)
+            lcd_put_menu(lcd, state)
+
+        elif event == DOUBLE_CLICK:
+            menu_double_click(state)
+            lcd_put_menu(lcd, state)
+
+        elif event is None:
+            utime.sleep_ms(button.wait_ms(SLEEP_TIME))
+
+    log.info("Button held for 1 second")
+
+def has_diagnostics(state):
+    """
+    Returns True if the menu has the encoder diagnostics page.
+
+    Args:
+        state (dict): State with the source of the encoder stats.
+
+    Returns:
+        bool
+    """
+    return ENCODER_STATS and state["stats"] is not None
+
+def menu_next(state):
+    """
+    Moves the menu to the next page: the next wheel mode, or with
+    ENCODER_STATS the diagnostics after the last mode. The diagnostics
+    page keeps the last mode selected.
+
+    Args:
+        state (dict): State containing the wheel mode.
+
+    Returns:
+        None
+    """
+    if state["diagnostics"]:
+        state["diagnostics"] = False
+        state["wheel_mode"] = 0
+    elif has_diagnostics(state) and state["wheel_mode"] == WHEEL_MODES - 1:
+        state["diagnostics"] = True
+    else:
+        state["wheel_mode"] = (state["wheel_mode"] + 1) % WHEEL_MODES
+
+def menu_previous(state):
+    """
+    Moves the menu back a page, undoing menu_next().
+
+    Args:
+        state (dict): State containing the wheel mode.
+
+    Returns:
+        None
+    """
+    if state["diagnostics"]:
+        state["diagnostics"] = False
+    elif has_diagnostics(state) and state["wheel_mode"] == 0:
+        state["diagnostics"] = True
+        state["wheel_mode"] = WHEEL_MODES - 1
+    else:
+        state["wheel_mode"] = (state["wheel_mode"] - 1) % WHEEL_MODES
+
+def menu_double_click(state):
+    """
+    Handles a double click in the menu: its first click already moved to
+    the next page, so that is undone, and the recording is toggled, or on
+    the diagnostics page the encoder stats are reset.
+
+    Args:
+        state (dict): State containing the wheel mode and the recorder.
+
+    Returns:
+        None
+    """
+    menu_previous(state)
+    if state["diagnostics"]:
+        state["stats"].reset_stats()
+        return
+    recorder = state["recorder"]
+    if recorder is None:
+        return
+    if recorder.recording():
+        recorder.stop()
+        log.info("recorded {} records to {}", recorder.records, recorder.name)
+    else:
+        log.info("recording to {}", recorder.start())
+
+def record_sample(state, val1, val2):
+    """
+    Adds the encoder values to the session recording, if one is running.
+
+    Args:
+        state (dict): State containing the wheel mode and the recorder.
+        val1, val2 (int): The encoder values.
+
+    Returns:
+        None
+    """
+    recorder = state["recorder"]
+    if recorder is not None:
+        recorder.sample(val1, val2, state["wheel_mode"])
+
+def record_event(state, val1, val2, event):
+    """
+    Adds a button event to the session recording, if one is running.
+
+    Args:
+        state (dict): State containing the recorder.
+        val1, val2 (int): The encoder values.
+        event (int): The button event.
+
+    Returns:
+        None
+    """
+    recorder = state["recorder"]
+    if recorder is not None:
+        recorder.event(val1, val2, event)
+
+def get_mode_string(state):
+    """
+    Returns the string representation of the current wheel mode.
+
+    Args:
+        state (dict): The state object containing the current wheel mode.
+
+    Returns:
+        str: The string representation of the current wheel mode.
+    """
+    modes = ["Both wheels", "Left wheel", "Right wheel", "Differential"]
+    return modes[state["wheel_mode"]]
+
+def read_encoders(state):
+    """
+    Reads the values of all encoders, taken at the same instant.
+
+    Args:
+        state (dict): State with the encoder bank.
+
+    Returns:
+        array: state["values"], the value of each encoder of the bank.
+    """
+    values = state["values"]
+    state["bank"].snapshot(values)
+    return values
+
+def disable_rotaries(state):
+    """
+    Stops counting on all rotary encoders.
+
+    Args:
+        state (dict): State with the encoder bank.
+
+    Returns:
+        None
+    """
+    state["bank"].pause()
+
+def enable_rotaries(state):
+    """
+    Enable or disable the rotary encoders based on the wheel mode specified in the state dictionary.
+
+    Parameters:
+    - state: Dictionary containing the current state and the encoder bank.
+
+    Returns:
+    None
+    """
+    mode = state["wheel_mode"]
+    if mode == 1:
+        state["bank"].resume(0b01)
+    elif mode == 2:
+        state["bank"].resume(0b10)
+    else:
+        state["bank"].resume()
+
+def calculate_half_ticks(val1, val2, state):
+    """
+    Combines the encoder values according to the wheel mode. The result
+    is in half steps so that the average of both wheels stays an integer.
+
+    Parameters:
+    val1 (int): Value of the first rotary encoder.
+    val2 (int): Value of the second rotary encoder.
+    state (dict): The state dictionary containing the wheel mode.
+
+    Returns:
+    int: Encoder half steps of the selected wheels.
+    """
+    if state["wheel_mode"] == 1:
+        return 2 * val1
+    if state["wheel_mode"] == 2:
+        return 2 * val2
+    return val1 + val2
+
+def calculate_distance(result, state):
+    """
+    Calculates the distance measured based on the result from rotary encoders and state.
+
+    Parameters:
+    result (int): The result value, in half steps.
+    state (dict): The state dictionary containing the distance accumulator.
+
+    Returns:
+    int: The calculated distance in micrometres.
+    """
+    return state["distance"].micrometres(result)
+
+def get_pose(state):
+    """
+    Returns what the differential mode shows.
+
+    Parameters:
+    state (dict): The state dictionary containing the wheel mode and the
+    odometry.
+
+    Returns:
+    tuple: (path length, displacement, heading) in micrometres and
+    degrees, or None if the wheel mode is not differential.
+    """
+    if state["wheel_mode"] != DIFFERENTIAL:
+        return None
+    odometry = state["odometry"]
+    return (odometry.path_um(), odometry.displacement_um(),
+            odometry.heading_deg())
+
+def calculate_step_speed(state):
+    """
+    Calculates the encoder speed from the speed estimators in state, using
+    the same wheels as the distance.
+
+    Parameters:
+    state (dict): The state dictionary containing the wheel mode and the
+    speed estimators.
+
+    Returns:
+    int: The speed in milli-steps per second.
+    """
+    if state["wheel_mode"] == 1:
+        return state["speed1"].speed()
+    if state["wheel_mode"] == 2:
+        return state["speed2"].speed()
+    return combined_speed((state["speed1"], state["speed2"]))
+
+def calculate_speed(state):
+    """
+    Calculates the push speed from the speed estimators in state.
+
+    Parameters:
+    state (dict): The state dictionary containing the wheel mode and the
+    speed estimators.
+
+    Returns:
+    int: The speed in millimetres per second.
+    """
+    return step_speed_to_speed(calculate_step_speed(state))
+
+def step_speed_to_speed(steps_per_s):
+    """
+    Converts an encoder speed to the push speed.
+
+    Parameters:
+    steps_per_s (int): The speed in milli-steps per second.
+
+    Returns:
+    int: The speed in millimetres per second.
+    """
+    if steps_per_s < 0:
+        return -step_speed_to_speed(-steps_per_s)
+    # Centi-steps times the millimetres per DISTANCE_DEN steps stays a
+    # small int up to about 20 m/s
+    return ((steps_per_s // 10 * (DISTANCE_NUM // 1000) + DISTANCE_DEN * 50) //
+            (DISTANCE_DEN * 100))
+
+def lcd_put_mode_text(lcd, state):
+    """
+    Displays the current mode on the LCD screen.
+
+    Args:
+        lcd: The LCD object used for displaying text.
+        state: State containing the mode.
+
+    Returns:
+        None
+    """
+    lcd.clear()
+    lcd.putstr("Mode:")
+    recorder = state["recorder"]
+    if recorder is not None and recorder.recording():
+        lcd.move_to(I2C_NUM_COLS - 3, 0)
+        lcd.putstr("REC")
+    lcd.move_to(0, 1)
+    lcd.putstr(get_mode_string(state))
+    lcd.flush()
+
+def lcd_put_menu(lcd, state):
+    """
+    Displays the current menu page: the mode, or the encoder diagnostics.
+
+    Args:
+        lcd: The LCD object used for displaying text.
+        state: State containing the mode and the menu page.
+
+    Returns:
+        None
+    """
+    if state["diagnostics"]:
+        lcd_put_diagnostics(lcd, state)
+    else:
+        lcd_put_mode_text(lcd, state)
+
+def lcd_put_diagnostics(lcd, state):
+    """
+    Displays the health of each encoder on a line of its own: the aborted
+    steps, the peak edge rate and the longest IRQ in microseconds. All
+    the stats are logged too.
+
+    Args:
+        lcd: The LCD object used for displaying text.
+        state: State with the encoder bank.
+
+    Returns:
+        None
+    """
+    lcd.clear()
+    for row, rotary in enumerate(state["stats"].rotaries[:I2C_NUM_ROWS]):
+        edges, steps, aborted, peak, isr_min, isr_avg, isr_max = rotary.stats()
+        log.info("encoder {} edges {} steps {} aborted {}",
+                 row + 1, edges, steps, aborted)
+        log.info("encoder {} peak {}/s", row + 1, peak)
+        log.info("encoder {} irq us min {} avg {} max {}",
+                 row + 1, isr_min, isr_avg, isr_max)
+        lcd.move_to(0, row)
+        lcd.putstr(DIAGNOSTICS_FORMAT.format(row + 1, min(aborted, 9999),
+                                             min(peak, 99999),
+                                             min(isr_max, 999)))
+    lcd.flush()
+
+def lcd_update_distance(lcd, distance):
+    """
+    Updates the distance on the LCD screen.
+
+    Args:
+        lcd: The LCD framebuffer used for displaying text.
+        distance: The distance to display, in micrometres.
+
+    Returns:
+        None
+    """
+    lcd_put_distance(lcd, distance)
+    lcd.flush()
+
+def lcd_put_distance(lcd, distance):
+    """
+    Writes the distance into the LCD framebuffer without flushing it.
+
+    Args:
+        lcd: The LCD framebuffer used for displaying text.
+        distance: The distance to display, in micrometres.
+
+    Returns:
+        None
+    """
+    if BIG_DISTANCE:
+        lcd_put_big_distance(lcd, distance)
+        return
+    lcd.move_to(0, 1)
+    lcd.write_bytes(DISTANCE_FIELD.render(distance))
+
+_big_digits = None
+
+def lcd_put_big_distance(lcd, distance):
+    """
+    Writes the distance in big digits over both lines of the LCD
+    framebuffer without flushing it.
+
+    Args:
+        lcd: The LCD framebuffer used for displaying text.
+        distance: The distance to display, in micrometres.
+
+    Returns:
+        None
+    """
+    global _big_digits
+    if _big_digits is None or _big_digits.lcd is not lcd:
+        _big_digits = BigDigits(lcd)
+    data = memoryview(BIG_DISTANCE_FIELD.render(distance))
+    width = BIG_DISTANCE_FIELD.num_width
+    _big_digits.draw(data[:width], data[width:])
+
+def lcd_update_speed(lcd, speed):
+    """
+    Updates the speed on the LCD screen.
+
+    Args:
+        lcd: The LCD framebuffer used for displaying text.
+        speed: The speed in millimetres per second.
+
+    Returns:
+        None
+    """
+    lcd_put_speed(lcd, speed)
+    lcd.flush()
+
+def lcd_put_speed(lcd, speed):
+    """
+    Writes the speed on the first line of the LCD framebuffer without
+    flushing it.
+
+    Args:
+        lcd: The LCD framebuffer used for displaying text.
+        speed: The speed in millimetres per second.
+
+    Returns:
+        None
+    """
+    if BIG_DISTANCE:
+        return # the big digits take the first line too
+    lcd.move_to(0, 0)
+    lcd.putstr("Speed")
+    lcd.write_bytes(SPEED_FIELD.render(speed))
+
+def lcd_update_odometry(lcd, pose):
+    """
+    Updates the differential mode readout on the LCD screen.
+
+    Args:
+        lcd: The LCD framebuffer used for displaying text.
+        pose: (path, displacement, heading) from get_pose().
+
+    Returns:
+        None
+    """
+    lcd_put_odometry(lcd, *pose)
+    lcd.flush()
+
+def lcd_put_odometry(lcd, path, displacement, heading):
+    """
+    Writes the path length on the first line and the displacement and
+    heading on the second line of the LCD framebuffer without flushing it.
+
+    Args:
+        lcd: The LCD framebuffer used for displaying text.
+        path: The path length in micrometres.
+        displacement: The straight line distance in micrometres.
+        heading: The heading in degrees.
+
+    Returns:
+        None
+    """
+    lcd.move_to(0, 0)
+    lcd.putstr("Path ")
+    lcd.write_bytes(PATH_FIELD.render(path))
+    lcd.move_to(0, 1)
+    lcd.putstr("D ")
+    lcd.write_bytes(DISPLACEMENT_FIELD.render(displacement))
+    lcd.putstr(" H")
+    lcd.write_bytes(HEADING_FIELD.render(heading))
@@ -0,0 +1,212 @@
+"""
+Two row big digits for HD44780 character LCDs.
+
+Each numeral is three cells wide and two rows high, drawn from eight
+custom glyphs in CGRAM plus the full block (0xff) of the character ROM.
+custom_char() costs a command and eight slow data writes, and changing a
+glyph that is on screen changes every cell showing it, so the glyphs go
+through a GlyphCache that remembers what each CGRAM slot holds and only
+uploads a slot when a glyph is missing. Once the font is loaded, a redraw
+only writes the cells whose codes changed, through an LcdFrameBuffer.
+"""
+
+from array import array
+
+# Glyph bitmaps, 8 rows of 5 pixels
+_LT = b"\x07\x0f\x1f\x1f\x1f\x1f\x1f\x1f"   # upper left corner
+_UB = b"\x1f\x1f\x1f\x00\x00\x00\x00\x00"   # upper bar
+_RT = b"\x1c\x1e\x1f\x1f\x1f\x1f\x1f\x1f"   # upper right corner
+_LL = b"\x1f\x1f\x1f\x1f\x1f\x1f\x0f\x07"   # lower left corner
+_LB = b"\x00\x00\x00\x00\x00\x1f\x1f\x1f"   # lower bar
+_LR = b"\x1f\x1f\x1f\x1f\x1f\x1f\x1e\x1c"   # lower right corner
+_UMB = b"\x1f\x1f\x1f\x00\x00\x00\x1f\x1f"  # upper and middle bars
+_PT = b"\x00\x00\x00\x00\x00\x0e\x0e\x0e"   # decimal point
+
+GLYPHS = (_LT, _UB, _RT, _LL, _LB, _LR, _UMB, _PT)
+
+# Cells of each character as top row, bottom row. Values below 8 are
+# indices into GLYPHS, anything else is a character code.
+_B = 0xff   # full block
+_S = 0x20   # space
+FONT = {
+    0x30: ((0, 1, 2), (3, 4, 5)),       # 0
+    0x31: ((1, 2, _S), (4, _B, 4)),     # 1
+    0x32: ((6, 6, 2), (3, 4, 4)),       # 2
+    0x33: ((6, 6, 2), (4, 4, 5)),       # 3
+    0x34: ((3, 4, _B), (_S, _S, _B)),   # 4
+    0x35: ((_B, 6, 6), (4, 4, 5)),      # 5
+    0x36: ((0, 6, 6), (3, 4, 5)),       # 6
+    0x37: ((1, 1, 2), (_S, _S, _B)),    # 7
+    0x38: ((0, 6, 2), (3, 4, 5)),       # 8
+    0x39: ((0, 6, 2), (_S, _S, _B)),    # 9
+    0x2d: ((4, 4), (_S, _S)),           # -
+    0x2e: ((_S,), (7,)),                # .
+    0x20: ((_S,), (_S,)),               # space
+}
+GAP = 1     # blank columns between two numerals
+
+
+class GlyphCache:
+    """
+    Keeps track of the glyphs loaded in the CGRAM slots of an LCD.
+
+    A glyph that is not loaded goes into a free slot, or else into the
+    slot least recently used. Slots used since the last new_frame() are
+    never replaced, so a frame can use at most slots different glyphs, and
+    everything on screen that shows custom characters should be redrawn
+    in every frame.
+
+    Args:
+        lcd (LcdApi): The LCD, not a framebuffer.
+        slots (int): CGRAM slots to use, from slot 0.
+    """
+    def __init__(self, lcd, slots=8):
+        self.lcd = lcd
+        self.slots = slots
+        self._used = array('i', bytes(4 * slots))
+        self._frame = 1
+        self.invalidate()
+        self.hits = 0
+        self.uploads = 0
+
+    def invalidate(self):
+        """
+        Forgets what CGRAM holds, e.g. after the LCD was initialized again.
+        """
+        self._glyphs = [None] * self.slots
+
+    def new_frame(self):
+        """
+        Starts a frame, allowing the glyphs of the previous one to be
+        replaced.
+        """
+        self._frame += 1
+
+    def slot(self, glyph):
+        """
+        Returns the slot, and so the character code, of glyph, uploading
+        it if it is not loaded.
+
+        Raises:
+            ValueError: If all slots are taken by glyphs of this frame.
+        """
+        glyphs = self._glyphs
+        used = self._used
+        for i in range(self.slots):
+            if glyphs[i] is glyph or glyphs[i] == glyph:
+                used[i] = self._frame
+                self.hits += 1
+                return i
+        victim = -1
+        oldest = self._frame
+        for i in range(self.slots):
+            if glyphs[i] is None:
+                victim = i
+                break
+            if used[i] < oldest:
+                oldest = used[i]
+                victim = i
+        if victim < 0:
+            raise ValueError("more than %d glyphs in a frame" % self.slots)
+        self.lcd.custom_char(victim, glyph)
+        glyphs[victim] = glyph
+        used[victim] = self._frame
+        self.uploads += 1
+        return victim
+
+    def stats(self):
+        """
+        Returns (hits, uploads) of slot().
+        """
+        return (self.hits, self.uploads)
+
+
+class BigDigits:
+    """
+    Draws numbers in two row digits over the first two lines of an LCD.
+
+    Args:
+        lcd: An LcdFrameBuffer, or an LcdApi to draw directly.
+        cache (GlyphCache): Cache of the CGRAM slots, by default a new one
+            for all eight slots of the LCD.
+    """
+    def __init__(self, lcd, cache=None):
+        self.lcd = lcd
+        if cache is None:
+            cache = GlyphCache(getattr(lcd, 'lcd', lcd))
+        self.cache = cache
+        columns = lcd.num_columns
+        self.num_columns = columns
+        self._top = bytearray(columns)
+        self._bottom = bytearray(columns)
+        self._codes = bytearray(len(GLYPHS))
+
+    def _cell(self, cell):
+        return self._codes[cell] if cell < 8 else cell
+
+    def draw(self, number, unit=b""):
+        """
+        Draws number right aligned in big digits, with unit stacked into
+        the last column: one character goes in the bottom row, two go one
+        above the other, e.g. b"km", and trailing spaces are ignored, so
+        the number and suffix of a FixedField can be passed as they are.
+        Characters without a big glyph are
+        drawn small in the bottom row. Columns left of the number are
+        cleared. Nothing is sent to a framebuffer until its flush().
+
+        Args:
+            number (bytes): Digits, '-', '.' and spaces.
+            unit (bytes): At most two characters.
+        """
+        cache = self.cache
+        cache.new_frame()
+        codes = self._codes
+        for i in range(len(GLYPHS)):
+            codes[i] = cache.slot(GLYPHS[i])
+        top = self._top
+        bottom = self._bottom
+        x = self.num_columns
+        n = len(unit)
+        while n and unit[n - 1] == 0x20:
+            n -= 1
+        if n:
+            x -= 1
+            top[x] = unit[0] if n > 1 else 0x20
+            bottom[x] = unit[n - 1]
+        # Right to left, so the last digit stays put as the number grows
+        numeral = False
+        i = len(number)
+        while i > 0 and x > 0:
+            i -= 1
+            c = number[i]
+            cells = FONT.get(c)
+            if cells is None:
+                x -= 1
+                top[x] = 0x20
+                bottom[x] = c
+                numeral = False
+                continue
+            upper, lower = cells
+            wide = len(upper) == 3
+            if numeral and wide:
+                for _ in range(GAP):
+                    if x > 0:
+                        x -= 1
+                        top[x] = 0x20
+                        bottom[x] = 0x20
+            j = len(upper)
+            while j > 0 and x > 0:
+                j -= 1
+                x -= 1
+                top[x] = self._cell(upper[j])
+                bottom[x] = self._cell(lower[j])
+            numeral = wide
+        while x > 0:
+            x -= 1
+            top[x] = 0x20
+            bottom[x] = 0x20
+        lcd = self.lcd
+        lcd.move_to(0, 0)
+        lcd.write_bytes(top)
+        lcd.move_to(0, 1)
+        lcd.write_bytes(bottom)
@@ -0,0 +1,182 @@
+"""
+Interrupt driven push button with debounce and gesture events.
+
+Edges are taken from the pin IRQ and debounced by timestamp, so press and
+hold durations are measured in milliseconds instead of main loop ticks.
+Gestures are put into a small preallocated queue:
+
+    CLICK         released before long_press_ms
+    DOUBLE_CLICK  a click within double_click_ms of the previous click,
+                  sent instead of a second CLICK
+    LONG_PRESS    held for long_press_ms, sent while still held
+    RELEASE       released, after any of the above
+
+A long press has no edge of its own, so it is detected by poll(), which
+get() calls. wait_ms() tells a caller how long it may sleep without
+missing it.
+"""
+
+import utime
+import machine
+from machine import Pin
+from array import array
+
+CLICK = 1
+DOUBLE_CLICK = 2
+LONG_PRESS = 3
+RELEASE = 4
+
+LONG_PRESS_MS = 1000
+DOUBLE_CLICK_MS = 300
+DEBOUNCE_MS = 20
+QUEUE_SIZE = 8
+
+
+class Button:
+    """
+    Args:
+        pin (Pin): The button pin, configured as input.
+        long_press_ms (int): Hold time for LONG_PRESS.
+        double_click_ms (int): Maximum time between the clicks of a
+            DOUBLE_CLICK, 0 to disable.
+        debounce_ms (int): Edges closer than this to the last accepted
+            edge are contact bounce.
+        active_low (bool): The pin reads 0 while pressed (pull-up wiring).
+        on_event (callable): Called from the IRQ on every debounced edge,
+            with the event it queued or None for a press, e.g. to wake a
+            task that then calls get() and wait_ms().
+        queue_size (int): Events held until get() (power of two).
+    """
+    def __init__(self, pin, long_press_ms=LONG_PRESS_MS,
+                 double_click_ms=DOUBLE_CLICK_MS, debounce_ms=DEBOUNCE_MS,
+                 active_low=True, on_event=None, queue_size=QUEUE_SIZE):
+        self.pin = pin
+        self.long_press_ms = long_press_ms
+        self.double_click_ms = double_click_ms
+        self.debounce_ms = debounce_ms
+        self.active_low = active_low
+        self.on_event = on_event
+        self._kinds = bytearray(queue_size)
+        self._times = array('i', bytes(4 * queue_size))
+        self._size = queue_size
+        self._mask = 2 * queue_size - 1
+        self._head = 0
+        self._tail = 0
+        self.overflows = 0
+        now = utime.ticks_ms()
+        self._pressed = self._read()
+        self._press_ms = now
+        self._edge_ms = utime.ticks_add(now, -debounce_ms)
+        self._long_sent = self._pressed  # held at start: not a gesture
+        self._click_ms = 0
+        self._click_valid = False
+        self.event_ms = 0
+        pin.irq(self._irq, Pin.IRQ_FALLING | Pin.IRQ_RISING)
+
+    def _read(self):
+        return self.pin.value() == (0 if self.active_low else 1)
+
+    def pressed(self):
+        """
+        Returns the debounced state of the button.
+        """
+        return self._pressed
+
+    def _emit(self, kind, now):
+        # Runs both in the IRQ and from poll(), so keep them apart
+        irq_state = machine.disable_irq()
+        head = self._head
+        if ((head - self._tail) & self._mask) == self._size:
+            self.overflows += 1
+        else:
+            i = head & (self._size - 1)
+            self._kinds[i] = kind
+            self._times[i] = now
+            self._head = (head + 1) & self._mask
+        machine.enable_irq(irq_state)
+
+    def _edge(self, pressed, now):
+        self._pressed = pressed
+        self._edge_ms = now
+        if pressed:
+            self._press_ms = now
+            self._long_sent = False
+            return None
+        if self._long_sent:
+            kind = RELEASE
+        else:
+            if (self._click_valid and self.double_click_ms and
+                    utime.ticks_diff(now, self._click_ms) <= self.double_click_ms):
+                kind = DOUBLE_CLICK
+                self._click_valid = False
+            else:
+                kind = CLICK
+                self._click_ms = now
+                self._click_valid = True
+            self._emit(kind, now)
+        self._emit(RELEASE, now)
+        return kind
+
+    def _irq(self, pin):
+        now = utime.ticks_ms()
+        if utime.ticks_diff(now, self._edge_ms) < self.debounce_ms:
+            return
+        pressed = self._read()
+        if pressed == self._pressed:
+            return
+        kind = self._edge(pressed, now)
+        if self.on_event is not None:
+            self.on_event(kind)
+
+    def poll(self):
+        """
+        Detects LONG_PRESS, and any final edge the debounce swallowed.
+        """
+        irq_state = machine.disable_irq()
+        now = utime.ticks_ms()
+        if utime.ticks_diff(now, self._edge_ms) >= self.debounce_ms:
+            pressed = self._read()
+            if pressed != self._pressed:
+                self._edge(pressed, now)
+        if (self._pressed and not self._long_sent and
+                utime.ticks_diff(now, self._press_ms) >= self.long_press_ms):
+            self._long_sent = True
+            self._click_valid = False
+            self._emit(LONG_PRESS, utime.ticks_add(self._press_ms,
+                                                   self.long_press_ms))
+        machine.enable_irq(irq_state)
+
+    def get(self):
+        """
+        Returns the next event, or None. The time it happened is left in
+        event_ms.
+        """
+        self.poll()
+        tail = self._tail
+        if tail == self._head:
+            return None
+        i = tail & (self._size - 1)
+        kind = self._kinds[i]
+        self.event_ms = self._times[i]
+        self._tail = (tail + 1) & self._mask
+        return kind
+
+    def held_ms(self):
+        """
+        Returns how long the button has been held, 0 when released.
+        """
+        if not self._pressed:
+            return 0
+        return utime.ticks_diff(utime.ticks_ms(), self._press_ms)
+
+    def wait_ms(self, max_ms=None):
+        """
+        Returns how long a caller may sleep before it has to call get()
+        again to see LONG_PRESS on time, at most max_ms. None means until
+        the next edge.
+        """
+        if self._pressed and not self._long_sent:
+            remaining = max(0, self.long_press_ms - self.held_ms())
+            if max_ms is None or remaining < max_ms:
+                return remaining
+        return max_ms
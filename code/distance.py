@@ -0,0 +1,62 @@
+"""
+Integer distance accumulator.
+
+The distance is counted in encoder half steps, so that the average of both
+wheels is still an integer, and converted to micrometres with the
+calibration constant given as a fraction: num micrometres per den steps.
+Unlike the float version, nothing drifts over long pushes and nothing is
+allocated while the values stay small ints, which covers about a kilometre
+in either direction.
+"""
+
+
+def _gcd(a, b):
+    while b:
+        a, b = b, a % b
+    return a
+
+
+class DistanceAccumulator:
+    """
+    Args:
+        num (int): Micrometres per den encoder steps.
+        den (int): Encoder steps.
+    """
+    def __init__(self, num, den):
+        # Micrometres per half step, reduced so that a remainder times num
+        # stays a small int
+        den *= 2
+        g = _gcd(num, den)
+        self.num = num // g
+        self.den = den // g
+        self.reset()
+
+    def reset(self):
+        """
+        Sets the distance back to zero.
+        """
+        self.half_ticks = 0
+        self._um = 0    # floor of the distance in micrometres
+        self._rem = 0   # and the rest, in 1/den micrometres
+
+    def add(self, half_ticks):
+        """
+        Adds half steps to the distance, e.g. when the encoders are reset.
+        """
+        self.half_ticks += half_ticks
+        self._um, self._rem = self._sum(half_ticks)
+
+    def _sum(self, half_ticks):
+        q, r = divmod(half_ticks, self.den)
+        rem = self._rem + r * self.num
+        return (self._um + q * self.num + rem // self.den, rem % self.den)
+
+    def micrometres(self, half_ticks=0):
+        """
+        Returns the distance plus half_ticks not added yet, in micrometres
+        truncated toward zero.
+        """
+        um, rem = self._sum(half_ticks)
+        if um < 0 and rem:
+            um += 1
+        return um
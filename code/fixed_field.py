@@ -0,0 +1,122 @@
+"""
+Allocation free fixed point formatter for LCD readouts.
+
+A FixedField renders an integer value into a preallocated bytearray of
+constant width: an optional sign column, the number with a fixed number of
+decimals, and a unit suffix at a fixed column. The bytes go straight to
+write_bytes() of an LcdApi or LcdFrameBuffer, without building strings.
+
+A field has a list of formats, e.g. meters and then kilometers. The first
+one the value fits in is used, so a growing distance switches unit instead
+of running into the text after it. If none fits, the number is replaced by
+the overflow marker.
+"""
+
+ALIGN_LEFT = 0
+ALIGN_RIGHT = 1
+
+OVERFLOW = b"OVERFLOW"
+
+
+class FixedField:
+    """
+    Args:
+        num_width (int): Characters for the sign and the number. The unit
+            suffix starts at this column.
+        formats (tuple): (scale, decimals, suffix) tuples tried in order.
+            The value is divided by scale, rounded half away from zero, and
+            shown with decimals decimal places and the bytes suffix.
+        align (int): ALIGN_LEFT or ALIGN_RIGHT of the number.
+        plus (int): Character code shown in the sign column of values that
+            are not negative, 0 for no sign column (negative values still
+            get a '-').
+        overflow (bytes): Shown, cut to num_width, when no format fits.
+    """
+    def __init__(self, num_width, formats, align=ALIGN_LEFT, plus=0x20,
+                 overflow=OVERFLOW):
+        self.num_width = num_width
+        self.formats = formats
+        self.align = align
+        self.plus = plus
+        self.overflow = overflow
+        suffix_width = 0
+        for _, _, suffix in formats:
+            suffix_width = max(suffix_width, len(suffix))
+        self.width = num_width + suffix_width
+        self.buf = bytearray(b' ' * self.width)
+        self._digits = bytearray(num_width)
+        # Index into formats of the last render, -1 for overflow
+        self.format_index = 0
+
+    def _digits_of(self, n, decimals):
+        # Writes n right aligned into _digits with a decimal point before
+        # the last decimals digits. Returns the index of the first digit,
+        # or -1 if it doesn't fit.
+        digits = self._digits
+        i = len(digits)
+        count = 0
+        while True:
+            if i == 0:
+                return -1
+            i -= 1
+            digits[i] = 0x30 + n % 10
+            n //= 10
+            count += 1
+            if count == decimals:
+                if i == 0:
+                    return -1
+                i -= 1
+                digits[i] = 0x2e
+            if n == 0 and count > decimals:
+                return i
+
+    def _place(self, sign, start, suffix):
+        # Lays out the sign, _digits[start:] and the suffix into buf
+        buf = self.buf
+        digits = self._digits
+        n = len(digits) - start + (1 if sign else 0)
+        pos = 0 if self.align == ALIGN_LEFT else self.num_width - n
+        for i in range(pos):
+            buf[i] = 0x20
+        if sign:
+            buf[pos] = sign
+            pos += 1
+        for i in range(start, len(digits)):
+            buf[pos] = digits[i]
+            pos += 1
+        for i in range(pos, self.num_width):
+            buf[i] = 0x20
+        pos = self.num_width
+        for c in suffix:
+            buf[pos] = c
+            pos += 1
+        for i in range(pos, self.width):
+            buf[i] = 0x20
+
+    def render(self, value):
+        """
+        Renders value into the field.
+
+        Returns:
+            bytearray: The field, valid until the next render.
+        """
+        negative = value < 0
+        magnitude = -value if negative else value
+        sign = 0x2d if negative else self.plus
+        room = self.num_width - (1 if sign else 0)
+        index = 0
+        for scale, decimals, suffix in self.formats:
+            n = (magnitude + scale // 2) // scale
+            start = self._digits_of(n, decimals)
+            if start >= 0 and len(self._digits) - start <= room:
+                self._place(sign, start, suffix)
+                self.format_index = index
+                return self.buf
+            index += 1
+        buf = self.buf
+        marker = self.overflow
+        for i in range(self.width):
+            buf[i] = marker[i] if i < len(marker) and i < self.num_width \
+                else 0x20
+        self.format_index = -1
+        return buf
@@ -136,13 +136,23 @@ class LcdApi:
         else:
             self.hal_write_data(ord(char))
             self.cursor_x += 1
+        self._wrap_cursor(char == '\n')
+
+    def _wrap_cursor(self, newline):
+        # The controller auto-increments the DDRAM address after each data
+        # write, so the cursor only has to be sent when it jumps: when the
+        # line is full (or ended by a newline) or it runs off the last line.
+        moved = False
         if self.cursor_x >= self.num_columns:
             self.cursor_x = 0
             self.cursor_y += 1
-            self.implied_newline = (char != '\n')
+            self.implied_newline = not newline
+            moved = True
         if self.cursor_y >= self.num_lines:
             self.cursor_y = 0
-        self.move_to(self.cursor_x, self.cursor_y)
+            moved = True
+        if moved:
+            self.move_to(self.cursor_x, self.cursor_y)
 
     def putstr(self, string):
         # Write the indicated string to the LCD at the current cursor
@@ -150,6 +160,50 @@ class LcdApi:
         for char in string:
             self.putchar(char)
 
+    def write_bytes(self, data):
+        # Writes the raw character codes in data at the current cursor
+        # position and advances the cursor by len(data). No cursor moves are
+        # sent; the controller auto-increments the address, so the caller
+        # must not cross the end of the line. Returns the number of bytes
+        # the hal put on the bus.
+        sent = self.hal_write_bytes(data)
+        self.cursor_x += len(data)
+        return sent
+
+    def putstr_fast(self, string):
+        # Same as putstr, but every run of characters that fits on the
+        # current line is sent with a single write_bytes call and the cursor
+        # is only moved explicitly at line wraps. Accepts str or bytes; a
+        # str is sent as ord() of each character, like putstr, so codes
+        # above 0x7f (e.g. "\xdf", the degree sign) stay one byte.
+        # Returns the number of bytes the hal put on the bus for the
+        # character data.
+        if isinstance(string, str):
+            encoded = string.encode()
+            if len(encoded) != len(string):
+                # Not ASCII, UTF-8 would send multibyte sequences
+                encoded = bytes(ord(char) for char in string)
+            string = encoded
+        data = memoryview(string)
+        sent = 0
+        start = 0
+        end = len(string)
+        while start < end:
+            newline = string[start] == 0x0a  # '\n'
+            if newline:
+                if not self.implied_newline:
+                    self.cursor_x = self.num_columns
+                start += 1
+            else:
+                stop = min(end, start + max(1, self.num_columns - self.cursor_x))
+                nl_pos = string.find(b'\n', start, stop)
+                if nl_pos >= 0:
+                    stop = nl_pos
+                sent += self.write_bytes(data[start:stop])
+                start = stop
+            self._wrap_cursor(newline)
+        return sent
+
     def custom_char(self, location, charmap):
         # Write a character to one of the 8 CGRAM locations, available
         # as chr(0) through chr(7).
@@ -176,11 +230,26 @@ class LcdApi:
         # It is expected that a derived HAL class will implement this function.
         raise NotImplementedError
 
+    def hal_write_command_nowait(self, cmd):
+        # Write a command to the LCD without waiting for the clear and home
+        # commands to finish, for callers that wait out the time themselves.
+        # A derived HAL class whose hal_write_command waits should override
+        # this.
+        self.hal_write_command(cmd)
+
     def hal_write_data(self, data):
         # Write data to the LCD.
         # It is expected that a derived HAL class will implement this function.
         raise NotImplementedError
 
+    def hal_write_bytes(self, data):
+        # Write a run of data bytes to the LCD and return the number of bytes
+        # put on the bus (one per data byte when the hal can't tell).
+        # A derived HAL class may override this with a bulk transfer.
+        for byte in data:
+            self.hal_write_data(byte)
+        return len(data)
+
     def hal_sleep_us(self, usecs):
         # Sleep for some time (given in microseconds)
         time.sleep_us(usecs)
@@ -0,0 +1,138 @@
+class LcdFrameBuffer:
+
+    # Shadow DDRAM framebuffer on top of an LcdApi instance.
+    #
+    # Callers draw into an in-memory copy of the num_lines x num_columns
+    # screen using the same clear/move_to/putstr calls as LcdApi. Nothing is
+    # sent to the LCD until flush(), which compares the buffer against a
+    # shadow copy of what the LCD currently shows and only writes the runs
+    # of cells that changed, each with a single cursor move.
+
+    def __init__(self, lcd, max_gap=1):
+        # max_gap is the number of unchanged cells that may be rewritten to
+        # join two changed runs. A cursor move costs as many bus bytes as one
+        # character, so bridging a single cell saves a transaction for free.
+        self.lcd = lcd
+        self.num_lines = lcd.num_lines
+        self.num_columns = lcd.num_columns
+        self.max_gap = max_gap
+        size = self.num_lines * self.num_columns
+        self._front = bytearray(b' ' * size)
+        self._shadow = bytearray(b' ' * size)
+        self._front_mv = memoryview(self._front)
+        self._shadow_mv = memoryview(self._shadow)
+        self.cursor_x = 0
+        self.cursor_y = 0
+        self.implied_newline = False
+        # Stats of the last flush()
+        self.cells_changed = 0
+        self.runs = 0
+        self.bytes_sent = 0
+        self.invalidate()
+
+    def invalidate(self):
+        # Forgets what is on the LCD, so the next flush() redraws everything.
+        # Use this when something else has written to the LCD directly.
+        self._stale = True
+
+    def clear(self):
+        # Blanks the buffer and moves the cursor to the top left corner.
+        # Unlike LcdApi.clear() this sends nothing to the LCD.
+        front = self._front
+        for i in range(len(front)):
+            front[i] = 0x20
+        self.cursor_x = 0
+        self.cursor_y = 0
+
+    def move_to(self, cursor_x, cursor_y):
+        # Moves the buffer cursor to the indicated (zero based) position.
+        self.cursor_x = cursor_x
+        self.cursor_y = cursor_y
+
+    def putchar(self, char):
+        # Writes a character into the buffer at the cursor position, with
+        # the same wrapping and newline rules as LcdApi.putchar.
+        if char == '\n':
+            if not self.implied_newline:
+                self.cursor_x = self.num_columns
+        else:
+            if self.cursor_x < self.num_columns:
+                self._front[self.cursor_y * self.num_columns +
+                            self.cursor_x] = ord(char)
+            self.cursor_x += 1
+        if self.cursor_x >= self.num_columns:
+            self.cursor_x = 0
+            self.cursor_y += 1
+            self.implied_newline = (char != '\n')
+        if self.cursor_y >= self.num_lines:
+            self.cursor_y = 0
+
+    def putstr(self, string):
+        # Writes the indicated string into the buffer at the cursor position.
+        for char in string:
+            self.putchar(char)
+
+    def write_bytes(self, data):
+        # Copies raw character codes into the buffer at the cursor position
+        # and advances the cursor, like LcdApi.write_bytes. Cells past the
+        # end of the line are dropped instead of wrapping.
+        start = self.cursor_y * self.num_columns + self.cursor_x
+        n = min(len(data), self.num_columns - self.cursor_x)
+        if n >= len(data):
+            self._front_mv[start:start + n] = data
+        elif n > 0:
+            self._front_mv[start:start + n] = data[:n]
+        self.cursor_x += len(data)
+        return len(data)
+
+    def get_line(self, line):
+        # Returns the buffered contents of a line as bytes.
+        start = line * self.num_columns
+        return bytes(self._front[start:start + self.num_columns])
+
+    def flush(self):
+        # Sends the changed cells to the LCD and returns how many changed.
+        # Per-frame stats are left in cells_changed, runs and bytes_sent
+        # (bytes_sent needs a hal that counts bus_bytes, like I2cLcd).
+        lcd = self.lcd
+        front = self._front
+        shadow = self._shadow
+        cols = self.num_columns
+        max_gap = self.max_gap
+        stale = self._stale
+        start_bytes = getattr(lcd, 'bus_bytes', 0)
+        changed = 0
+        runs = 0
+        for y in range(self.num_lines):
+            base = y * cols
+            x = 0
+            while x < cols:
+                if not stale and front[base + x] == shadow[base + x]:
+                    x += 1
+                    continue
+                # Grow the run until more than max_gap unchanged cells follow
+                start = x
+                end = x + 1
+                changed += 1
+                gap = 0
+                x += 1
+                while x < cols:
+                    if stale or front[base + x] != shadow[base + x]:
+                        changed += 1
+                        end = x + 1
+                        gap = 0
+                    else:
+                        gap += 1
+                        if gap > max_gap:
+                            break
+                    x += 1
+                lcd.move_to(start, y)
+                lcd.write_bytes(self._front_mv[base + start:base + end])
+                self._shadow_mv[base + start:base + end] = \
+                    self._front_mv[base + start:base + end]
+                runs += 1
+        self._stale = False
+        self.cells_changed = changed
+        self.runs = runs
+        self.bytes_sent = getattr(lcd, 'bus_bytes', 0) - start_bytes
+        return changed
@@ -0,0 +1,264 @@
+"""
+Queued, non-blocking LCD backend.
+
+LcdQueue takes the same move_to/write_bytes/clear/custom_char calls as an
+LcdApi, so an LcdFrameBuffer can draw through it, but only records the
+commands and data bytes in a bounded ring. drain() sends them later, from
+a machine.Timer callback (start_timer()) or from an async task, and waits
+out the settle time of the clear and home commands by returning early
+instead of sleeping. Runs of data bytes go out as one bulk transfer.
+
+If the ring fills up, the caller sends the oldest entries itself, so a
+caller can block, but only for as long as it takes to make room. stats()
+reports the depth of the queue and the worst time a call spent queueing.
+"""
+
+import utime
+from lcd_api import LcdApi
+
+SIZE = 256          # ring entries, one per command or data byte
+SLOW_SETTLE_US = 5000   # after clear and home, as in I2cLcd
+BATCH = 4           # transfers per drain() call
+TIMER_PERIOD_MS = 1
+
+_COMMAND = 0
+_DATA = 1
+
+
+class LcdQueue:
+    """
+    Args:
+        lcd (LcdApi): The LCD the queue is drained to.
+        size (int): Ring entries; one entry is kept free.
+        batch (int): Transfers sent per drain() call, which bounds the time
+            a timer callback takes.
+    """
+    def __init__(self, lcd, size=SIZE, batch=BATCH):
+        self.lcd = lcd
+        self.num_lines = lcd.num_lines
+        self.num_columns = lcd.num_columns
+        self.size = size
+        self.batch = batch
+        self._kinds = bytearray(size)
+        self._values = bytearray(size)
+        self._values_mv = memoryview(self._values)
+        self._head = 0      # next entry to send, only moved by drain()
+        self._tail = 0      # next free entry, only moved by the callers
+        self._ready_at = utime.ticks_us()
+        self._draining = False
+        self._timer = None
+        self.cursor_x = 0
+        self.cursor_y = 0
+        # Called when an entry is queued, e.g. to wake a drain task
+        self.on_queued = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.max_depth = 0
+        self.max_enqueue_us = 0
+        self.stalls = 0
+        self.sent = 0
+
+    def stats(self):
+        """
+        Returns (depth, max depth, worst enqueue us, stalls) since
+        reset_stats(). A stall is a call that found the ring full and had
+        to send entries itself.
+        """
+        return (self.depth(), self.max_depth, self.max_enqueue_us,
+                self.stalls)
+
+    def depth(self):
+        """
+        Returns the number of entries waiting to be sent.
+        """
+        return (self._tail - self._head) % self.size
+
+    def idle(self):
+        """
+        Returns True when everything queued has been sent.
+        """
+        return self._head == self._tail
+
+    def _put(self, kind, value):
+        tail = self._tail
+        after = tail + 1
+        if after == self.size:
+            after = 0
+        if after == self._head:
+            self.stalls += 1
+            while after == self._head:
+                self._wait_ready()
+                self.drain()
+        self._kinds[tail] = kind
+        self._values[tail] = value
+        self._tail = after
+
+    def _done(self, start):
+        # Ends a public call: updates the stats and wakes the drain task
+        elapsed = utime.ticks_diff(utime.ticks_us(), start)
+        if elapsed > self.max_enqueue_us:
+            self.max_enqueue_us = elapsed
+        depth = self.depth()
+        if depth > self.max_depth:
+            self.max_depth = depth
+        if self.on_queued is not None:
+            self.on_queued()
+
+    def command(self, cmd):
+        """
+        Queues a command byte.
+        """
+        start = utime.ticks_us()
+        self._put(_COMMAND, cmd)
+        self._done(start)
+
+    def _move(self, cursor_x, cursor_y):
+        self.cursor_x = cursor_x
+        self.cursor_y = cursor_y
+        addr = cursor_x & 0x3f
+        if cursor_y & 1:
+            addr += 0x40
+        if cursor_y & 2:
+            addr += self.num_columns
+        self._put(_COMMAND, LcdApi.LCD_DDRAM | addr)
+
+    def move_to(self, cursor_x, cursor_y):
+        """
+        Queues a cursor move, like LcdApi.move_to.
+        """
+        start = utime.ticks_us()
+        self._move(cursor_x, cursor_y)
+        self._done(start)
+
+    def write_bytes(self, data):
+        """
+        Queues character codes, like LcdApi.write_bytes: the caller must not
+        cross the end of the line.
+
+        Returns:
+            int: The number of bytes queued.
+        """
+        start = utime.ticks_us()
+        for byte in data:
+            self._put(_DATA, byte)
+        self.cursor_x += len(data)
+        self._done(start)
+        return len(data)
+
+    def clear(self):
+        """
+        Queues a clear and home, like LcdApi.clear. The entries after them
+        are only sent once the LCD is done.
+        """
+        start = utime.ticks_us()
+        self._put(_COMMAND, LcdApi.LCD_CLR)
+        self._put(_COMMAND, LcdApi.LCD_HOME)
+        self.cursor_x = 0
+        self.cursor_y = 0
+        self._done(start)
+
+    def custom_char(self, location, charmap):
+        """
+        Queues a CGRAM upload, like LcdApi.custom_char.
+        """
+        start = utime.ticks_us()
+        self._put(_COMMAND, LcdApi.LCD_CGRAM | ((location & 0x7) << 3))
+        for i in range(8):
+            self._put(_DATA, charmap[i])
+        self._move(self.cursor_x, self.cursor_y)
+        self._done(start)
+
+    def ready_in_us(self):
+        """
+        Returns how long the LCD is still busy with a clear or home, in us,
+        0 if the next entry can be sent.
+        """
+        return max(0, utime.ticks_diff(self._ready_at, utime.ticks_us()))
+
+    def _wait_ready(self):
+        wait = self.ready_in_us()
+        if wait:
+            utime.sleep_us(wait)
+
+    def drain(self, batch=None):
+        """
+        Sends up to batch transfers of queued entries, stopping early while
+        the LCD is busy with a clear or home.
+
+        Returns:
+            bool: True if the queue is empty.
+        """
+        if self._draining:
+            # Called from a timer callback while the caller drains
+            return False
+        self._draining = True
+        try:
+            if batch is None:
+                batch = self.batch
+            lcd = self.lcd
+            kinds = self._kinds
+            size = self.size
+            while batch > 0 and self._head != self._tail:
+                if self.ready_in_us():
+                    return False
+                head = self._head
+                if kinds[head] == _COMMAND:
+                    cmd = self._values[head]
+                    lcd.hal_write_command_nowait(cmd)
+                    if cmd <= 3:
+                        self._ready_at = utime.ticks_add(utime.ticks_us(),
+                                                         SLOW_SETTLE_US)
+                    end = head + 1
+                else:
+                    # A run of data up to a command, the end of the ring or
+                    # a line's worth, in one transfer
+                    tail = self._tail
+                    limit = min(size, head + self.num_columns)
+                    end = head + 1
+                    while end < limit and end != tail and kinds[end] == _DATA:
+                        end += 1
+                    lcd.hal_write_bytes(self._values_mv[head:end])
+                self.sent += end - head
+                self._head = 0 if end == size else end
+                batch -= 1
+            return self._head == self._tail
+        finally:
+            self._draining = False
+
+    def sync(self):
+        """
+        Sends everything queued, sleeping through the settle times.
+        """
+        while not self.drain(self.size):
+            self._wait_ready()
+
+    async def wait(self):
+        """
+        Waits until everything queued has been sent by whatever drains the
+        queue.
+        """
+        try:
+            import asyncio
+        except ImportError:
+            import uasyncio as asyncio
+        while not self.idle():
+            await asyncio.sleep(max(self.ready_in_us(), 1000) / 1000000)
+
+    def _on_timer(self, timer):
+        self.drain()
+
+    def start_timer(self, period_ms=TIMER_PERIOD_MS):
+        """
+        Drains the queue from a periodic machine.Timer callback.
+        """
+        from machine import Timer
+        if self._timer is None:
+            self._timer = Timer()
+        self._timer.init(mode=Timer.PERIODIC, period=period_ms,
+                         callback=self._on_timer)
+
+    def stop_timer(self):
+        if self._timer is not None:
+            self._timer.deinit()
+            self._timer = None
@@ -0,0 +1,244 @@
+"""
+Buffered, rate limited logging for the main loop.
+
+print() formats its arguments right away, which allocates, and over USB
+CDC it can block while the host isn't reading. A Logger only stores the
+format string and up to four arguments in a preallocated ring, and
+formats and writes them in flush(), which a machine.Timer callback
+(start_timer()) or an async task (run()) does in the background, a few
+entries per call. Both run on the main thread, so flush() first polls the
+stream and stops while it can't take more, e.g. USB CDC with a host that
+isn't reading; the messages wait in the ring, or are dropped once it is
+full. A call above the level returns after one comparison, so logging at
+OFF costs next to nothing.
+
+A message can be limited to one per interval with limit(). The calls held
+back are counted and reported with the next one written. If the ring is
+full, new messages are dropped and counted, the caller never waits.
+"""
+
+import sys
+import utime
+
+try:
+    import select
+except ImportError:
+    select = None
+
+OFF = 0
+ERROR = 1
+WARNING = 2
+INFO = 3
+DEBUG = 4
+
+SIZE = 32           # ring entries, one per message
+BATCH = 4           # messages written per flush() call
+TIMER_PERIOD_MS = 100
+ARGS = 4            # arguments stored per message
+
+# Fields of a rate limit record
+_L_INTERVAL = 0
+_L_LAST_MS = 1
+_L_HELD = 2
+
+
+class Logger:
+    """
+    Args:
+        level (int): Messages up to this level are kept, OFF for none.
+        size (int): Ring entries; one entry is kept free.
+        batch (int): Messages written per flush() call, which bounds the
+            time a timer callback takes.
+        stream: Where the messages go, sys.stdout by default, looked up
+            when they are written.
+    """
+    def __init__(self, level=INFO, size=SIZE, batch=BATCH, stream=None):
+        self.level = level
+        self.size = size
+        self.batch = batch
+        self.stream = stream
+        self._msgs = [None] * size
+        self._args = [None] * (ARGS * size)
+        self._held = [0] * size     # calls held back before each message
+        self._head = 0      # next message to write, only moved by flush()
+        self._tail = 0      # next free entry, only moved by the callers
+        self._limits = {}
+        self._flushing = False
+        self._timer = None
+        self._poll_stream = None
+        self._poller = None
+        self.dropped = 0
+        self.written = 0
+        self.busy = 0
+
+    def stats(self):
+        """
+        Returns (depth, dropped, written, busy): messages waiting to be
+        written, messages lost to a full ring, messages written and flushes
+        cut short by a stream that couldn't take more.
+        """
+        return ((self._tail - self._head) % self.size, self.dropped,
+                self.written, self.busy)
+
+    def limit(self, msg, interval_ms):
+        """
+        Keeps at most one msg, the format string as passed to log(), per
+        interval_ms. 0 removes the limit.
+        """
+        if interval_ms > 0:
+            self._limits[msg] = [interval_ms,
+                                 utime.ticks_add(utime.ticks_ms(),
+                                                 -interval_ms), 0]
+        else:
+            self._limits.pop(msg, None)
+
+    def log(self, level, msg, a=None, b=None, c=None, d=None):
+        """
+        Queues msg at level, to be written as msg.format(a, b, c, d). The
+        arguments are kept as they are until then, so pass values that
+        don't change, not e.g. an array that is reused.
+        """
+        if level > self.level:
+            return
+        held = 0
+        if self._limits:
+            limit = self._limits.get(msg)
+            if limit is not None:
+                now = utime.ticks_ms()
+                if (utime.ticks_diff(now, limit[_L_LAST_MS]) <
+                        limit[_L_INTERVAL]):
+                    limit[_L_HELD] += 1
+                    return
+                limit[_L_LAST_MS] = now
+                held = limit[_L_HELD]
+                limit[_L_HELD] = 0
+        tail = self._tail
+        after = tail + 1
+        if after == self.size:
+            after = 0
+        if after == self._head:
+            self.dropped += 1
+            return
+        self._msgs[tail] = msg
+        args = self._args
+        i = tail * ARGS
+        args[i] = a
+        args[i + 1] = b
+        args[i + 2] = c
+        args[i + 3] = d
+        self._held[tail] = held
+        self._tail = after
+
+    def error(self, msg, a=None, b=None, c=None, d=None):
+        if self.level >= ERROR:
+            self.log(ERROR, msg, a, b, c, d)
+
+    def warning(self, msg, a=None, b=None, c=None, d=None):
+        if self.level >= WARNING:
+            self.log(WARNING, msg, a, b, c, d)
+
+    def info(self, msg, a=None, b=None, c=None, d=None):
+        if self.level >= INFO:
+            self.log(INFO, msg, a, b, c, d)
+
+    def debug(self, msg, a=None, b=None, c=None, d=None):
+        if self.level >= DEBUG:
+            self.log(DEBUG, msg, a, b, c, d)
+
+    def _writable(self, stream):
+        # Polls stream for room without blocking. Streams that can't be
+        # polled, like most Python objects, count as always writable.
+        if stream is not self._poll_stream:
+            self._poll_stream = stream
+            self._poller = None
+            if select is not None:
+                try:
+                    poller = select.poll()
+                    poller.register(stream, select.POLLOUT)
+                    self._poller = poller
+                except Exception:
+                    pass
+        if self._poller is None:
+            return True
+        try:
+            return bool(self._poller.poll(0))
+        except Exception:
+            self._poller = None
+            return True
+
+    def flush(self, batch=None):
+        """
+        Formats and writes up to batch queued messages, stopping early
+        while the stream isn't writable.
+
+        Returns:
+            bool: True if the queue is empty.
+        """
+        if self._flushing:
+            # Called from a timer callback while the caller flushes
+            return False
+        self._flushing = True
+        try:
+            if batch is None:
+                batch = self.batch
+            stream = self.stream or sys.stdout
+            msgs = self._msgs
+            args = self._args
+            while batch > 0 and self._head != self._tail:
+                if not self._writable(stream):
+                    self.busy += 1
+                    return False
+                head = self._head
+                i = head * ARGS
+                line = msgs[head].format(args[i], args[i + 1], args[i + 2],
+                                         args[i + 3])
+                held = self._held[head]
+                # Let go of the arguments before the slot is reused
+                msgs[head] = None
+                args[i] = args[i + 1] = args[i + 2] = args[i + 3] = None
+                self._head = 0 if head + 1 == self.size else head + 1
+                if held:
+                    line = "{} ({} more)".format(line, held)
+                stream.write(line)
+                stream.write("\n")
+                self.written += 1
+                batch -= 1
+            return self._head == self._tail
+        finally:
+            self._flushing = False
+
+    def sync(self):
+        """
+        Writes everything queued that the stream takes now.
+        """
+        self.flush(self.size)
+
+    async def run(self, period_ms=TIMER_PERIOD_MS):
+        """
+        Flushes the queue every period_ms, as an asyncio task.
+        """
+        try:
+            import asyncio
+        except ImportError:
+            import uasyncio as asyncio
+        while True:
+            self.flush()
+            await asyncio.sleep(period_ms / 1000)
+
+    def _on_timer(self, timer):
+        self.flush()
+
+    def start_timer(self, period_ms=TIMER_PERIOD_MS):
+        """
+        Flushes the queue from a periodic machine.Timer callback.
+        """
+        from machine import Timer
+        if self._timer is None:
+            self._timer = Timer()
+        self._timer.init(mode=Timer.PERIODIC, period=period_ms,
+                         callback=self._on_timer)
+
+    def stop_timer(self):
+        if self._timer is not None:
+            self._timer.deinit()
+            self._timer = None
@@ -0,0 +1,257 @@
+"""
+Event driven runtime for the Measurement Fox, built on asyncio.
+
+Instead of polling every SLEEP_TIME ms, the encoder listeners and the
+button IRQ set flags that wake the task waiting for them: the display task
+redraws as soon as an encoder moves, so the latency of a reading is bounded
+by the I2C transfer rather than by loop ticks, and the CPU sleeps while the
+device is idle. The button task handles the button events and the menu.
+
+On the host it runs under CPython asyncio with the stand-ins from host/.
+"""
+
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+
+import utime
+import app as fox
+from lcd_queue import LcdQueue
+from button import CLICK, DOUBLE_CLICK, LONG_PRESS
+
+SPEED_REFRESH_MS = 250  # redraw period of the speed while the wheels turn
+
+try:
+    ThreadSafeFlag = asyncio.ThreadSafeFlag
+except AttributeError:
+    class ThreadSafeFlag(asyncio.Event):
+        """
+        CPython stand-in: listeners and pin handlers run on the event loop
+        thread there, so an Event that clears itself on wait will do.
+        """
+        async def wait(self):
+            await super().wait()
+            self.clear()
+
+
+async def wait_flag(flag, timeout_ms=None):
+    """
+    Waits for a flag, at most timeout_ms if given.
+
+    Returns:
+        bool: True if the flag was set, False on timeout.
+    """
+    if timeout_ms is None:
+        await flag.wait()
+        return True
+    try:
+        await asyncio.wait_for(flag.wait(), timeout_ms / 1000)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
+class App:
+    """
+    The tasks of the event driven runtime and the state they share.
+
+    Args:
+        lcd: LcdFrameBuffer to draw on.
+        r1, r2: The rotary encoders.
+        button (Button): The push button.
+        state (dict): State from app.init_state().
+    """
+    def __init__(self, lcd, r1, r2, button, state):
+        self.lcd = lcd
+        self.r1 = r1
+        self.r2 = r2
+        self.button = button
+        self.state = state
+        self.in_menu = False
+        self.encoder_flag = ThreadSafeFlag()
+        self.button_flag = ThreadSafeFlag()
+        self.reset_latency_stats()
+        r1.add_listener(self._on_encoder)
+        r2.add_listener(self._on_encoder)
+        button.on_event = self._on_button
+
+    def reset_latency_stats(self):
+        self._changed_at = None
+        self.latency_count = 0
+        self.latency_total_us = 0
+        self.latency_max_us = 0
+
+    def latency_stats(self):
+        """
+        Returns (count, average us, max us) of the time from an encoder
+        change to the end of the redraw that shows it.
+        """
+        if not self.latency_count:
+            return (0, 0, 0)
+        return (self.latency_count,
+                self.latency_total_us // self.latency_count,
+                self.latency_max_us)
+
+    def _on_encoder(self, delta):
+        if self._changed_at is None:
+            self._changed_at = utime.ticks_us()
+        self.encoder_flag.set()
+
+    def _on_button(self, event):
+        self.button_flag.set()
+
+    def redraw(self):
+        """
+        Shows the current distance and speed.
+        """
+        state = self.state
+        fox.end_splash(self.lcd, state, True)
+        state["speed1"].feed(self.r1)
+        state["speed2"].feed(self.r2)
+        values = fox.read_encoders(state)
+        val1, val2 = values[0], values[1]
+        fox.record_sample(state, val1, val2)
+        state["result"] = fox.calculate_half_ticks(val1, val2, state)
+        if state["wheel_mode"] == fox.DIFFERENTIAL:
+            state["odometry"].update(val1, val2)
+            fox.lcd_put_odometry(self.lcd, *fox.get_pose(state))
+        else:
+            if fox.SHOW_SPEED:
+                fox.lcd_put_speed(self.lcd, fox.calculate_speed(state))
+            fox.lcd_put_distance(self.lcd,
+                                 fox.calculate_distance(state["result"], state))
+        self.lcd.flush()
+        fox.save_distance(state)
+        if self._changed_at is not None:
+            latency = utime.ticks_diff(utime.ticks_us(), self._changed_at)
+            self._changed_at = None
+            self.latency_count += 1
+            self.latency_total_us += latency
+            self.latency_max_us = max(self.latency_max_us, latency)
+
+    async def display_task(self):
+        moving = False
+        while True:
+            # While the wheels turn the speed has to decay on screen even
+            # without new steps; when idle just sleep until the next one
+            changed = await wait_flag(self.encoder_flag,
+                                      SPEED_REFRESH_MS if moving else None)
+            if self.in_menu:
+                continue
+            self.redraw()
+            moving = changed or fox.calculate_speed(self.state) != 0
+            if not moving:
+                # Stopped: save what the batching held back
+                fox.save_distance(self.state, True)
+
+    async def splash_task(self):
+        """
+        Replaces the welcome screen with the reading when its time is up,
+        unless motion already did.
+        """
+        until = self.state["splash_until"]
+        if until is not None:
+            await asyncio.sleep(max(0, utime.ticks_diff(until,
+                                                        utime.ticks_ms())) / 1000)
+        if not self.in_menu:
+            fox.end_splash(self.lcd, self.state, True)
+
+    async def next_event(self):
+        """
+        Waits for the next button event, sleeping until an edge or until a
+        long press can be due.
+        """
+        while True:
+            event = self.button.get()
+            if event is not None:
+                values = fox.read_encoders(self.state)
+                fox.record_event(self.state, values[0], values[1], event)
+                return event
+            await wait_flag(self.button_flag, self.button.wait_ms())
+
+    def reset_distance(self):
+        state = self.state
+        state["bank"].reset()
+        state["result"] = 0
+        state["distance"].reset()
+        state["odometry"].reset()
+        state["odometry"].sync(0, 0)
+        fox.save_distance(state, True)
+        fox.reset_lcd(self.lcd, 0, fox.get_pose(state))
+
+    async def menu(self):
+        """
+        Menu mode, the event driven counterpart of app.enter_menu: a click
+        selects the next wheel mode or the diagnostics page, a double click
+        toggles the session recording, a hold leaves the menu.
+        """
+        state = self.state
+        self.in_menu = True
+        fox.disable_rotaries(state)
+        values = fox.read_encoders(state)
+        state["distance"].add(fox.calculate_half_ticks(values[0], values[1],
+                                                       state))
+        state["bank"].reset()
+        state["result"] = 0
+        state["diagnostics"] = False
+        fox.lcd_put_mode_text(self.lcd, state)
+        while True:
+            event = await self.next_event()
+            if event == LONG_PRESS:
+                break
+            if event == CLICK:
+                fox.menu_next(state)
+                fox.lcd_put_menu(self.lcd, state)
+            elif event == DOUBLE_CLICK:
+                fox.menu_double_click(state)
+                fox.lcd_put_menu(self.lcd, state)
+        fox.enable_rotaries(state)
+        state["speed1"].reset()
+        state["speed2"].reset()
+        state["odometry"].sync(0, 0)
+        fox.save_distance(state, True)
+        fox.reset_lcd(self.lcd, fox.calculate_distance(0, state),
+                      fox.get_pose(state))
+        self.in_menu = False
+
+    async def button_task(self):
+        while True:
+            event = await self.next_event()
+            if event == LONG_PRESS:
+                await self.menu()
+            elif event == CLICK or event == DOUBLE_CLICK:
+                self.reset_distance()
+
+    async def lcd_task(self, queue):
+        """
+        Sends the writes queued by an LcdQueue, waking when something is
+        queued and sleeping out the settle times.
+        """
+        flag = ThreadSafeFlag()
+        queue.on_queued = flag.set
+        while True:
+            if queue.drain():
+                await flag.wait()
+            else:
+                await asyncio.sleep(queue.ready_in_us() / 1000000)
+
+    async def main(self):
+        if isinstance(self.lcd.lcd, LcdQueue):
+            asyncio.create_task(self.lcd_task(self.lcd.lcd))
+        asyncio.create_task(fox.log.run(fox.LOG_FLUSH_MS))
+        asyncio.create_task(self.splash_task())
+        asyncio.create_task(self.display_task())
+        await self.button_task()
+
+
+def run():
+    """
+    Initializes the hardware and runs the event driven runtime forever.
+    """
+    lcd, r1, r2, button, state = fox.setup(lcd_timer=False)
+    app = App(lcd, r1, r2, button, state)
+    try:
+        asyncio.run(app.main())
+    finally:
+        asyncio.new_event_loop()  # Clear retained asyncio state
@@ -0,0 +1,456 @@
+"""
+Dual core runtime for the Measurement Fox, built on _thread.
+
+Core 1 owns the rotary encoders. Their IRQs are registered from the thread
+started there, so they fire on core 1, and it turns the counts into a
+distance and a speed every CORE1_PERIOD_MS. Core 0 owns the LCD, the button
+and the menu, so a slow I2C redraw can never delay encoder processing.
+
+Core 1 publishes its results in a Snapshot, guarded by a sequence counter so
+that neither core ever waits for the other. Core 0 sends its commands
+(reset, pause for the menu, resume) through a lock protected mailbox.
+
+On the host _thread is the CPython module threading is built on, so the
+same code runs there with the stand-ins from host/.
+"""
+
+import _thread
+import utime
+from array import array
+import app as fox
+from button import CLICK, DOUBLE_CLICK, LONG_PRESS
+
+CORE1_PERIOD_MS = 10    # how often core 1 publishes distance and speed
+UI_PERIOD_MS = 50       # how often core 0 looks for a new snapshot
+SPEED_REFRESH_MS = 250  # republish period of a non-zero speed
+START_TIMEOUT_MS = 2000 # longest wait for core 1 to set up or stop
+
+# Snapshot fields
+S_SEQ = 0
+S_VAL1 = 1          # encoder values
+S_VAL2 = 2
+S_HALF_TICKS = 3    # distance in half steps, including the old result
+S_SPEED = 4         # speed in milli-steps per second
+S_DONE = 5          # number of commands core 1 has executed
+S_MICROMETRES = 6   # distance in micrometres
+S_PATH = 7          # differential mode path length in micrometres
+S_DISPLACEMENT = 8  # and displacement in micrometres
+S_HEADING = 9       # and heading in degrees
+SNAPSHOT_SIZE = 10
+
+# Commands
+CMD_NONE = 0
+CMD_RESET = 1       # zero the distance
+CMD_PAUSE = 2       # fold the readings into the distance, stop counting
+CMD_RESUME = 3      # count again with the wheel mode given as argument
+CMD_RESTORE = 4     # set the distance to the half steps given as argument
+CMD_RESET_STATS = 5 # clear the encoder health counters
+
+
+class Snapshot:
+    """
+    Sequence lock over an array of ints, for one writer and any number of
+    readers. The writer makes the sequence odd while it updates the fields
+    and a reader retries until it copied them between two reads of the same
+    even sequence. Nobody blocks or allocates.
+
+    Args:
+        size (int): Number of fields, including S_SEQ.
+    """
+    def __init__(self, size=SNAPSHOT_SIZE):
+        self.data = array('i', bytes(4 * size))
+        self.retries = 0
+
+    def begin(self):
+        """
+        Starts an update, called by the writer before setting data[i].
+        """
+        self.data[S_SEQ] = (self.data[S_SEQ] + 1) & 0x3fffffff
+
+    def end(self):
+        """
+        Publishes the fields set since begin().
+        """
+        self.data[S_SEQ] = (self.data[S_SEQ] + 1) & 0x3fffffff
+
+    def read(self, out):
+        """
+        Copies a consistent set of fields into out.
+
+        Args:
+            out (array): Array of the same size.
+
+        Returns:
+            int: The sequence of the copy, even.
+        """
+        data = self.data
+        n = len(data)
+        while True:
+            seq = data[S_SEQ]
+            if not seq & 1:
+                for i in range(1, n):
+                    out[i] = data[i]
+                if data[S_SEQ] == seq:
+                    out[S_SEQ] = seq
+                    return seq
+            self.retries += 1
+
+
+class CoreStats:
+    """
+    The encoder stats of core 1 for the diagnostics page on core 0, as
+    state["stats"]: they are read straight from its encoders, and reset by
+    a command, so that only core 1 writes them.
+
+    Args:
+        core (EncoderCore): A started core.
+    """
+    def __init__(self, core):
+        self.core = core
+        self.rotaries = core.bank.rotaries
+
+    def reset_stats(self):
+        self.core.command(CMD_RESET_STATS)
+
+
+class EncoderCore:
+    """
+    The encoder side, run on core 1 by start().
+
+    Args:
+        period_ms (int): Publishing period.
+    """
+    def __init__(self, period_ms=CORE1_PERIOD_MS):
+        self.period_ms = period_ms
+        self.snapshot = Snapshot()
+        self._lock = _thread.allocate_lock()
+        self._cmd = CMD_NONE
+        self._arg = 0
+        self._posted = 0
+        self._done = 0
+        self.running = False
+        self.started = False
+        self.error = None   # what stopped core 1, if it raised
+        self.r1 = None
+        self.r2 = None
+        self.bank = None
+
+    def start(self, timeout_ms=START_TIMEOUT_MS):
+        """
+        Starts core 1 and waits until its encoders are set up.
+
+        Raises:
+            Exception: What core 1 raised while setting up.
+            RuntimeError: If it wasn't set up within timeout_ms.
+        """
+        self.running = True
+        self.started = False
+        self.error = None
+        _thread.start_new_thread(self._run, ())
+        deadline = utime.ticks_add(utime.ticks_ms(), timeout_ms)
+        while not self.started:
+            self.check()
+            if utime.ticks_diff(deadline, utime.ticks_ms()) <= 0:
+                self.running = False
+                raise RuntimeError("core 1 did not start")
+            utime.sleep_ms(1)
+
+    def stop(self, timeout_ms=START_TIMEOUT_MS):
+        """
+        Stops core 1 and releases the encoder pins.
+
+        Returns:
+            bool: False if core 1 was still running after timeout_ms.
+        """
+        self.running = False
+        deadline = utime.ticks_add(utime.ticks_ms(), timeout_ms)
+        while self.started:
+            if utime.ticks_diff(deadline, utime.ticks_ms()) <= 0:
+                return False
+            utime.sleep_ms(1)
+        return True
+
+    def check(self):
+        """
+        Raises what stopped core 1, if it raised.
+        """
+        if self.error is not None:
+            raise self.error
+
+    def post(self, cmd, arg=0):
+        """
+        Sends a command to core 1, waiting while the previous one is still
+        pending.
+
+        Returns:
+            int: The value S_DONE reaches once the command has run.
+        """
+        while True:
+            with self._lock:
+                if self._cmd == CMD_NONE:
+                    self._cmd = cmd
+                    self._arg = arg
+                    self._posted += 1
+                    return self._posted
+            utime.sleep_ms(1)
+
+    def command(self, cmd, arg=0):
+        """
+        Sends a command to core 1 and waits until it has run.
+        """
+        serial = self.post(cmd, arg)
+        while self.snapshot.data[S_DONE] - serial < 0:
+            self.check()
+            utime.sleep_ms(1)
+
+    def _take(self):
+        with self._lock:
+            cmd = self._cmd
+            arg = self._arg
+            self._cmd = CMD_NONE
+        return cmd, arg
+
+    def _execute(self, cmd, arg, state):
+        bank = state["bank"]
+        if cmd == CMD_RESET:
+            bank.reset()
+            state["distance"].reset()
+            state["odometry"].reset()
+        elif cmd == CMD_PAUSE:
+            fox.disable_rotaries(state)
+            values = fox.read_encoders(state)
+            state["distance"].add(fox.calculate_half_ticks(values[0],
+                                                           values[1], state))
+            bank.reset()
+        elif cmd == CMD_RESUME:
+            state["wheel_mode"] = arg
+            fox.enable_rotaries(state)
+        elif cmd == CMD_RESTORE:
+            state["distance"].reset()
+            state["distance"].add(arg)
+        elif cmd == CMD_RESET_STATS:
+            bank.reset_stats()
+        state["speed1"].reset()
+        state["speed2"].reset()
+        values = fox.read_encoders(state)
+        state["odometry"].sync(values[0], values[1])
+        self._done += 1
+
+    def _run(self):
+        bank = None
+        try:
+            state = fox.init_state()
+            bank = self.bank = fox.use_rotaries(
+                state, fox.init_rotaries(hard_irq=True))
+            self.r1, self.r2 = bank.rotaries
+            self._loop(state)
+        except Exception as e:
+            # Kept for core 0, an exception would otherwise only end this
+            # thread
+            self.error = e
+        finally:
+            if bank is not None:
+                bank.close()
+            self.started = False
+
+    def _loop(self, state):
+        distance = state["distance"]
+        odometry = self._odometry = state["odometry"]
+        self._done = 0
+        self._publish(0, 0, 0, 0, 0)
+        self.started = True
+        published_ms = utime.ticks_ms()
+        while self.running:
+            cmd, arg = self._take()
+            if cmd != CMD_NONE:
+                self._execute(cmd, arg, state)
+            data = self.snapshot.data
+            state["speed1"].feed(self.r1)
+            state["speed2"].feed(self.r2)
+            values = fox.read_encoders(state)
+            val1, val2 = values[0], values[1]
+            if state["wheel_mode"] == fox.DIFFERENTIAL:
+                odometry.update(val1, val2)
+            result = fox.calculate_half_ticks(val1, val2, state)
+            half = distance.half_ticks + result
+            speed = fox.calculate_step_speed(state)
+            now = utime.ticks_ms()
+            # A non-zero speed decays without new steps, so republish
+            # it now and then even when nothing else changed
+            if (val1 != data[S_VAL1] or val2 != data[S_VAL2] or
+                    half != data[S_HALF_TICKS] or
+                    self._done != data[S_DONE] or
+                    (speed != data[S_SPEED] and (speed == 0 or
+                     utime.ticks_diff(now, published_ms) >= SPEED_REFRESH_MS))):
+                self._publish(val1, val2, half, speed,
+                              distance.micrometres(result))
+                published_ms = now
+            utime.sleep_ms(self.period_ms)
+
+    def _publish(self, val1, val2, half, speed, um):
+        snapshot = self.snapshot
+        data = snapshot.data
+        odometry = self._odometry
+        path = odometry.path_um()
+        displacement = odometry.displacement_um()
+        heading = odometry.heading_deg()
+        snapshot.begin()
+        data[S_VAL1] = val1
+        data[S_VAL2] = val2
+        data[S_HALF_TICKS] = half
+        data[S_SPEED] = speed
+        data[S_DONE] = self._done
+        data[S_MICROMETRES] = um
+        data[S_PATH] = path
+        data[S_DISPLACEMENT] = displacement
+        data[S_HEADING] = heading
+        snapshot.end()
+
+
+class App:
+    """
+    The user interface side, run on core 0.
+
+    Args:
+        lcd: LcdFrameBuffer to draw on.
+        button (Button): The push button.
+        core (EncoderCore): The started encoder side.
+        state (dict): State from app.init_state(), for the wheel mode,
+            the odometer and the recorder.
+    """
+    def __init__(self, lcd, button, core, state):
+        self.lcd = lcd
+        self.button = button
+        self.core = core
+        self.state = state
+        self.snap = array('i', bytes(4 * SNAPSHOT_SIZE))
+        self._drawn = -1
+
+    def distance(self):
+        """
+        Returns the distance of the last snapshot read, in micrometres.
+        """
+        return self.snap[S_MICROMETRES]
+
+    def pose(self):
+        """
+        Returns (path, displacement, heading) of the last snapshot read, or
+        None if the wheel mode is not differential.
+        """
+        if self.state["wheel_mode"] != fox.DIFFERENTIAL:
+            return None
+        snap = self.snap
+        return (snap[S_PATH], snap[S_DISPLACEMENT], snap[S_HEADING])
+
+    def redraw(self):
+        """
+        Reads the latest snapshot and shows it if it is new.
+
+        Returns:
+            bool: True if the screen was updated.
+        """
+        seq = self.core.snapshot.read(self.snap)
+        if seq == self._drawn:
+            return False
+        self._drawn = seq
+        snap = self.snap
+        if self.state["wheel_mode"] == fox.DIFFERENTIAL:
+            fox.lcd_put_odometry(self.lcd, snap[S_PATH], snap[S_DISPLACEMENT],
+                                 snap[S_HEADING])
+        else:
+            if fox.SHOW_SPEED:
+                fox.lcd_put_speed(self.lcd,
+                                  fox.step_speed_to_speed(snap[S_SPEED]))
+            fox.lcd_put_distance(self.lcd, self.distance())
+        self.lcd.flush()
+        return True
+
+    def save(self, now=False):
+        """
+        Saves the distance of the last snapshot read to the odometer log.
+        """
+        odometer = self.state["odometer"]
+        if odometer is None:
+            return
+        if now:
+            odometer.save(self.snap[S_HALF_TICKS], self.state["wheel_mode"])
+        else:
+            odometer.update(self.snap[S_HALF_TICKS], self.state["wheel_mode"])
+
+    def reset_screen(self):
+        self.core.snapshot.read(self.snap)
+        fox.reset_lcd(self.lcd, self.distance(), self.pose())
+        self._drawn = -1
+
+    def reset_distance(self):
+        self.core.command(CMD_RESET)
+        self.reset_screen()
+        self.save(True)
+
+    def menu(self):
+        """
+        Pauses counting on core 1 while app.enter_menu runs here.
+        """
+        self.core.command(CMD_PAUSE)
+        fox.enter_menu(self.lcd, self.button, self.state)
+        self.core.command(CMD_RESUME, self.state["wheel_mode"])
+        self.reset_screen()
+        self.save(True)
+
+    def step(self):
+        """
+        One iteration of the core 0 loop.
+        """
+        self.core.check()
+        if self.state["splash_until"] is not None:
+            # The welcome screen ends when its time is up or the wheels move
+            self.core.snapshot.read(self.snap)
+            if fox.splash_over(self.state,
+                               self.snap[S_VAL1] or self.snap[S_VAL2]):
+                self.reset_screen()
+        elif self.redraw():
+            fox.record_sample(self.state, self.snap[S_VAL1], self.snap[S_VAL2])
+        self.save()
+        event = self.button.get()
+        if event is not None:
+            fox.record_event(self.state, self.snap[S_VAL1], self.snap[S_VAL2],
+                             event)
+        if event == LONG_PRESS:
+            self.menu()
+        elif event == CLICK or event == DOUBLE_CLICK:
+            self.reset_distance()
+
+    def main(self):
+        while True:
+            self.step()
+            utime.sleep_ms(self.button.wait_ms(UI_PERIOD_MS))
+
+
+def run():
+    """
+    Starts the encoders on core 1 and runs the user interface on this core
+    forever.
+    """
+    fox.boot_mark("imports")
+    core = EncoderCore()
+    core.start()
+    fox.boot_mark("encoders")
+    state = fox.init_state()
+    state["stats"] = CoreStats(core)
+    state["odometer"] = fox.init_odometer(state)
+    state["recorder"] = fox.init_recorder()
+    core.command(CMD_RESTORE, state["distance"].half_ticks)
+    core.command(CMD_RESUME, state["wheel_mode"])
+    button = fox.init_button(fox.PIN_BUTTON)
+    fox.boot_mark("state")
+    lcd = fox.init_framebuffer(fox.PIN_SDA, fox.PIN_SCL)
+    fox.log.start_timer(fox.LOG_FLUSH_MS)
+    fox.boot_mark("lcd")
+    state["splash_until"] = utime.ticks_add(utime.ticks_ms(), fox.SPLASH_TIME)
+    if fox.BOOT_PROFILE:
+        fox.print_boot_timeline()
+    app = App(lcd, button, core, state)
+    try:
+        app.main()
+    finally:
+        core.stop()
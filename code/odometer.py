@@ -0,0 +1,260 @@
+"""
+Persistent odometer on the flash filesystem.
+
+The distance is saved as fixed size records appended to a ring of files:
+
+    seq         uint32  record number, one more than the previous record
+    half_ticks  int32   total distance in encoder half steps
+    mode        uint8   wheel mode
+    crc         uint32  CRC-32 of the fields above
+
+Records are only appended, and a file is truncated only when the ring comes
+back to it, so the filesystem spreads the writes over the flash and a power
+cut can at most lose the record being written. Writes are batched: a record
+is written when the distance changed by min_half_ticks, or when it changed
+at all and interval_ms has passed since the last write.
+
+On boot, recover() reads the first record of each file to find the newest
+one, and then binary searches that file for its last valid record, so only
+O(log n) records are read.
+"""
+
+import os
+import struct
+import utime
+from binascii import crc32
+
+RECORD_FORMAT = '<IiB3x'
+RECORD_SIZE = 16            # the fields and the CRC
+RECORDS_PER_FILE = 256      # one 4 KiB flash sector of records per file
+FILES = 4
+INTERVAL_MS = 10000
+PROG_SIZE = 256             # smallest flash program, the page size
+APPEND_PROGRAM = 2 * PROG_SIZE  # a page of data and one of file metadata
+CREATE_PROGRAM = PROG_SIZE  # directory entry of a new or truncated file
+ERASE_CYCLES = 100000       # flash endurance per sector
+
+
+class Odometer:
+    """
+    Args:
+        prefix (str): Path prefix of the files, numbered from 0.
+        min_half_ticks (int): Distance change that is saved right away.
+        interval_ms (int): Smaller changes are saved after this long.
+        files (int): Files in the ring.
+        records_per_file (int): Records per file.
+    """
+    def __init__(self, prefix, min_half_ticks, interval_ms=INTERVAL_MS,
+                 files=FILES, records_per_file=RECORDS_PER_FILE):
+        self.prefix = prefix
+        self.min_half_ticks = min_half_ticks
+        self.interval_ms = interval_ms
+        self.files = files
+        self.records_per_file = records_per_file
+        self._record = bytearray(RECORD_SIZE)
+        self._file = 0
+        self._count = 0
+        self.seq = 0
+        self.half_ticks = 0
+        self.mode = 0
+        self._saved_ms = utime.ticks_ms()
+        self._started_ms = self._saved_ms
+        self.reset_stats()
+
+    def _name(self, index):
+        return "%s%d.bin" % (self.prefix, index)
+
+    def _pack(self, seq, half_ticks, mode):
+        record = self._record
+        struct.pack_into(RECORD_FORMAT, record, 0, seq, half_ticks, mode)
+        crc = crc32(memoryview(record)[:RECORD_SIZE - 4]) & 0xffffffff
+        struct.pack_into('<I', record, RECORD_SIZE - 4, crc)
+        return record
+
+    def _read(self, f, index):
+        # Returns (seq, half_ticks, mode) of a record, or None if it is torn
+        # or corrupt
+        f.seek(index * RECORD_SIZE)
+        n = f.readinto(self._record)
+        if n != RECORD_SIZE:
+            return None
+        record = self._record
+        crc = struct.unpack_from('<I', record, RECORD_SIZE - 4)[0]
+        if crc32(memoryview(record)[:RECORD_SIZE - 4]) & 0xffffffff != crc:
+            return None
+        self.records_read += 1
+        return struct.unpack_from(RECORD_FORMAT, record, 0)
+
+    def _size(self, index):
+        try:
+            return os.stat(self._name(index))[6]
+        except OSError:
+            return 0
+
+    def _records_in(self, index):
+        return self._size(index) // RECORD_SIZE
+
+    def _last_valid(self, index):
+        # Binary searches a file for its last valid record. Records before
+        # a torn or corrupt one are all valid, and a valid record's seq is
+        # the first seq plus its index. Returns (index, record) or None.
+        n = self._records_in(index)
+        if n == 0:
+            return None
+        with open(self._name(index), 'rb') as f:
+            first = self._read(f, 0)
+            if first is None:
+                return None
+            lo, hi = 0, n - 1
+            best = first
+            while lo < hi:
+                mid = (lo + hi + 1) // 2
+                record = self._read(f, mid)
+                if record is not None and record[0] == first[0] + mid:
+                    lo = mid
+                    best = record
+                else:
+                    hi = mid - 1
+        return lo, best
+
+    def recover(self):
+        """
+        Finds the latest valid record and continues the log after it.
+
+        Returns:
+            tuple: (half_ticks, mode) of the record, or None if there is
+            none.
+        """
+        newest = -1
+        newest_seq = -1
+        for index in range(self.files):
+            if not self._records_in(index):
+                continue
+            with open(self._name(index), 'rb') as f:
+                record = self._read(f, 0)
+            if record is not None and record[0] > newest_seq:
+                newest = index
+                newest_seq = record[0]
+        if newest < 0:
+            return None
+        last = self._last_valid(newest)
+        position, (seq, half_ticks, mode) = last
+        self._file = newest
+        # Anything after the last valid record is garbage, a corrupt record
+        # or a torn one shorter than RECORD_SIZE: start the next file rather
+        # than appending behind it, which would misalign every later record
+        self._count = position + 1
+        if self._size(newest) != self._count * RECORD_SIZE:
+            self._count = self.records_per_file
+        self.seq = seq
+        self.half_ticks = half_ticks
+        self.mode = mode
+        return half_ticks, mode
+
+    def update(self, half_ticks, mode):
+        """
+        Saves the distance if it changed enough, or long enough ago.
+
+        Returns:
+            bool: True if a record was written.
+        """
+        if mode == self.mode:
+            change = abs(half_ticks - self.half_ticks)
+            if change == 0:
+                return False
+            if (change < self.min_half_ticks and
+                    utime.ticks_diff(utime.ticks_ms(), self._saved_ms)
+                    < self.interval_ms):
+                return False
+        self._write(half_ticks, mode)
+        return True
+
+    def save(self, half_ticks, mode):
+        """
+        Saves the distance now if it differs from the last record, e.g.
+        after a reset or when the wheels stop.
+        """
+        if half_ticks != self.half_ticks or mode != self.mode:
+            self._write(half_ticks, mode)
+
+    def _write(self, half_ticks, mode):
+        if self._count >= self.records_per_file:
+            self._file = (self._file + 1) % self.files
+            self._count = 0
+        self.seq += 1
+        record = self._pack(self.seq, half_ticks, mode)
+        if not self._count:
+            self.files_created += 1
+        with open(self._name(self._file), 'ab' if self._count else 'wb') as f:
+            f.write(record)
+        self._count += 1
+        self.half_ticks = half_ticks
+        self.mode = mode
+        self._saved_ms = utime.ticks_ms()
+        self.records_written += 1
+
+    def reset_stats(self):
+        self.records_written = 0
+        self.records_read = 0
+        self.files_created = 0
+        self._started_ms = utime.ticks_ms()
+
+    def programmed_estimate(self):
+        """
+        Returns the flash bytes programmed since reset_stats(), estimated
+        from the writes made: the filesystem doesn't report what it
+        programs, so every append counts as APPEND_PROGRAM bytes and every
+        file created or truncated by the ring as CREATE_PROGRAM more.
+        """
+        return (self.records_written * APPEND_PROGRAM +
+                self.files_created * CREATE_PROGRAM)
+
+    def stats(self):
+        """
+        Returns (records written, payload bytes, files created, estimated
+        flash bytes programmed) since reset_stats(), see
+        programmed_estimate().
+        """
+        return (self.records_written,
+                self.records_written * RECORD_SIZE,
+                self.files_created,
+                self.programmed_estimate())
+
+    def estimated_write_amplification(self):
+        """
+        Returns the estimated flash bytes programmed per payload byte for
+        the writes since reset_stats(), or None if there were none.
+        """
+        if not self.records_written:
+            return None
+        return self.programmed_estimate() / (self.records_written *
+                                             RECORD_SIZE)
+
+    def lifetime_years(self, records_per_hour=None, fs_bytes=None):
+        """
+        Estimates how long the flash lasts at a write rate, assuming the
+        filesystem spreads the writes over all of its blocks, with the
+        flash bytes per record of programmed_estimate().
+
+        Args:
+            records_per_hour (float): Default the rate since reset_stats().
+            fs_bytes (int): Size of the filesystem, default from statvfs.
+
+        Returns:
+            float: Years, or None if nothing has been written.
+        """
+        if records_per_hour is None:
+            hours = utime.ticks_diff(utime.ticks_ms(), self._started_ms) / 3600000
+            if hours <= 0:
+                return None
+            records_per_hour = self.records_written / hours
+        if not records_per_hour:
+            return None
+        if fs_bytes is None:
+            vfs = os.statvfs(self.prefix.rpartition('/')[0] or '/')
+            fs_bytes = vfs[0] * vfs[2]
+        per_record = APPEND_PROGRAM
+        if self.records_written:
+            per_record = self.programmed_estimate() / self.records_written
+        flash_per_hour = records_per_hour * per_record
+        return fs_bytes * ERASE_CYCLES / flash_per_hour / (24 * 365)
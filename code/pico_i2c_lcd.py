@@ -12,15 +12,56 @@ MASK_E  = 0x04       # P2
 SHIFT_BACKLIGHT = 3  # P3
 SHIFT_DATA      = 4  # P4-P7
 
+# Garbage collection policies for the HAL transfers
+GC_ALWAYS   = 0      # gc.collect() after every transfer
+GC_NEVER    = 1      # leave collection to the application
+GC_EVERY_N  = 2      # gc.collect() every gc_interval transfers
+GC_LOW_MEM  = 3      # gc.collect() only when gc.mem_free() < gc_threshold
+
+try:
+    _mem_alloc = gc.mem_alloc
+    _mem_free = gc.mem_free
+except AttributeError:
+    # No heap statistics outside MicroPython
+    def _mem_alloc():
+        return 0
+
+    def _mem_free():
+        return 1 << 30
+
 class I2cLcd(LcdApi):
     
     #Implements a HD44780 character LCD connected via PCF8574 on I2C
 
-    def __init__(self, i2c, i2c_addr, num_lines, num_columns):
+    # Time the LCD needs after power-up before it accepts the reset
+    POWERUP_MS = 20
+
+    def __init__(self, i2c, i2c_addr, num_lines, num_columns,
+                 gc_policy=GC_ALWAYS, gc_interval=64, gc_threshold=8192,
+                 powered_ms=0):
+        # powered_ms is how long the LCD has been powered already, e.g. the
+        # time spent booting, and is taken off the power-up delay.
         self.i2c = i2c
         self.i2c_addr = i2c_addr
-        self.i2c.writeto(self.i2c_addr, bytes([0]))
-        utime.sleep_ms(20)   # Allow LCD time to powerup
+        self.gc_policy = gc_policy
+        self.gc_interval = gc_interval
+        self.gc_threshold = gc_threshold
+        self._gc_countdown = gc_interval
+        self.reset_stats()
+        # Preallocated scratch buffers so a transfer never allocates
+        self._buf = bytearray(4)
+        self._buf1 = memoryview(self._buf)[:1]
+        self._buf2 = memoryview(self._buf)[:2]
+        self._buf4 = memoryview(self._buf)
+        # Reused by hal_write_bytes, four bus bytes per character, with one
+        # view per run length up to a full line
+        self._bulk_buf = bytearray(4 * num_columns)
+        bulk = memoryview(self._bulk_buf)
+        self._bulk_views = [bulk[:4 * n] for n in range(num_columns + 1)]
+        self._buf[0] = 0
+        self._transfer(self._buf1)
+        if powered_ms < self.POWERUP_MS:
+            utime.sleep_ms(self.POWERUP_MS - powered_ms)  # Allow LCD time to powerup
         # Send reset 3 times
         self.hal_write_init_nibble(self.LCD_FUNCTION_RESET)
         utime.sleep_ms(5)    # Need to delay at least 4.1 msec
@@ -36,51 +77,112 @@ class I2cLcd(LcdApi):
         if num_lines > 1:
             cmd |= self.LCD_FUNCTION_2LINES
         self.hal_write_command(cmd)
+        if gc_policy == GC_ALWAYS:
+            gc.collect()
+
+    def reset_stats(self):
+        # Starts a new measurement period (e.g. one display refresh) for
+        # stats().
+        self.transfers = 0
+        self.collections = 0
+        self.bus_bytes = 0
+        self._heap_freed = 0
+        self._heap_mark = _mem_alloc()
+
+    def stats(self):
+        # Returns (transfers, collections, heap bytes allocated) since the
+        # last reset_stats(). The heap figure is only available on
+        # MicroPython and reads 0 elsewhere.
+        allocated = _mem_alloc() - self._heap_mark + self._heap_freed
+        return (self.transfers, self.collections, allocated)
+
+    def _transfer(self, buf):
+        # Sends buf in one I2C transaction and applies the gc policy.
+        self.i2c.writeto(self.i2c_addr, buf)
+        self.transfers += 1
+        self.bus_bytes += len(buf)
+        policy = self.gc_policy
+        if policy == GC_NEVER:
+            return
+        if policy == GC_EVERY_N:
+            self._gc_countdown -= 1
+            if self._gc_countdown > 0:
+                return
+            self._gc_countdown = self.gc_interval
+        elif policy == GC_LOW_MEM:
+            if _mem_free() >= self.gc_threshold:
+                return
+        before = _mem_alloc()
         gc.collect()
+        self._heap_freed += before - _mem_alloc()
+        self.collections += 1
+
+    def _write_nibbles(self, flags, value):
+        # Fills the scratch buffer with both nibbles of value, each strobed
+        # with E. Data is latched on the falling edge of E.
+        buf = self._buf
+        byte = flags | (((value >> 4) & 0x0f) << SHIFT_DATA)
+        buf[0] = byte | MASK_E
+        buf[1] = byte
+        byte = flags | ((value & 0x0f) << SHIFT_DATA)
+        buf[2] = byte | MASK_E
+        buf[3] = byte
+        self._transfer(self._buf4)
 
     def hal_write_init_nibble(self, nibble):
         # Writes an initialization nibble to the LCD.
         # This particular function is only used during initialization.
         byte = ((nibble >> 4) & 0x0f) << SHIFT_DATA
-        self.i2c.writeto(self.i2c_addr, bytes([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytes([byte]))
-        gc.collect()
+        self._buf[0] = byte | MASK_E
+        self._buf[1] = byte
+        self._transfer(self._buf2)
         
     def hal_backlight_on(self):
         # Allows the hal layer to turn the backlight on
-        self.i2c.writeto(self.i2c_addr, bytes([1 << SHIFT_BACKLIGHT]))
-        gc.collect()
+        self._buf[0] = 1 << SHIFT_BACKLIGHT
+        self._transfer(self._buf1)
         
     def hal_backlight_off(self):
         #Allows the hal layer to turn the backlight off
-        self.i2c.writeto(self.i2c_addr, bytes([0]))
-        gc.collect()
+        self._buf[0] = 0
+        self._transfer(self._buf1)
         
     def hal_write_command(self, cmd):
         # Write a command to the LCD. Data is latched on the falling edge of E.
-        byte = ((self.backlight << SHIFT_BACKLIGHT) |
-                (((cmd >> 4) & 0x0f) << SHIFT_DATA))
-        self.i2c.writeto(self.i2c_addr, bytes([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytes([byte]))
-        byte = ((self.backlight << SHIFT_BACKLIGHT) |
-                ((cmd & 0x0f) << SHIFT_DATA))
-        self.i2c.writeto(self.i2c_addr, bytes([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytes([byte]))
+        self._write_nibbles(self.backlight << SHIFT_BACKLIGHT, cmd)
         if cmd <= 3:
             # The home and clear commands require a worst case delay of 4.1 msec
             utime.sleep_ms(5)
-        gc.collect()
+
+    def hal_write_command_nowait(self, cmd):
+        # Write a command to the LCD, leaving the delay after the home and
+        # clear commands to the caller.
+        self._write_nibbles(self.backlight << SHIFT_BACKLIGHT, cmd)
 
     def hal_write_data(self, data):
         # Write data to the LCD. Data is latched on the falling edge of E.
-        byte = (MASK_RS |
-                (self.backlight << SHIFT_BACKLIGHT) |
-                (((data >> 4) & 0x0f) << SHIFT_DATA))
-        self.i2c.writeto(self.i2c_addr, bytes([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytes([byte]))
-        byte = (MASK_RS |
-                (self.backlight << SHIFT_BACKLIGHT) |
-                ((data & 0x0f) << SHIFT_DATA))      
-        self.i2c.writeto(self.i2c_addr, bytes([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytes([byte]))
-        gc.collect()
+        self._write_nibbles(MASK_RS | (self.backlight << SHIFT_BACKLIGHT),
+                            data)
+
+    def hal_write_bytes(self, data):
+        # Write a run of data bytes to the LCD in one I2C transaction. Each
+        # byte is packed as the same four E strobes hal_write_data sends.
+        # Returns the number of bytes put on the bus.
+        count = 4 * len(data)
+        if count > len(self._bulk_buf):
+            self._bulk_buf = bytearray(count)
+            bulk = memoryview(self._bulk_buf)
+            self._bulk_views = [bulk[:4 * n] for n in range(len(data) + 1)]
+        buf = self._bulk_buf
+        flags = MASK_RS | (self.backlight << SHIFT_BACKLIGHT)
+        i = 0
+        for data_byte in data:
+            byte = flags | (((data_byte >> 4) & 0x0f) << SHIFT_DATA)
+            buf[i] = byte | MASK_E
+            buf[i + 1] = byte
+            byte = flags | ((data_byte & 0x0f) << SHIFT_DATA)
+            buf[i + 2] = byte | MASK_E
+            buf[i + 3] = byte
+            i += 4
+        self._transfer(self._bulk_views[len(data)])
+        return count
@@ -0,0 +1,134 @@
+"""
+Binary session recorder.
+
+A session is a file with a 12 byte header followed by fixed size records
+of four little endian int32 fields:
+
+    time_ms     milliseconds since the session started
+    val1        first encoder value
+    val2        second encoder value
+    tag         kind << 8 | arg
+
+where kind is SAMPLE (arg is the wheel mode) or EVENT (arg is the button
+event). Records are collected in a preallocated array and written to flash
+a whole block at a time. host/session_reader.py reads the files back.
+"""
+
+import os
+import struct
+import utime
+from array import array
+
+MAGIC = b"FOXS"
+VERSION = 1
+HEADER_FORMAT = '<4sHHI'    # magic, version, record size, block records
+HEADER_SIZE = 12
+FIELDS = 4
+RECORD_SIZE = 4 * FIELDS
+BLOCK_RECORDS = 128         # 2 KiB per flash write
+
+SAMPLE = 0
+EVENT = 1
+
+
+class Recorder:
+    """
+    Args:
+        prefix (str): Path prefix of the session files, numbered from 0.
+        block_records (int): Records buffered between flash writes.
+    """
+    def __init__(self, prefix, block_records=BLOCK_RECORDS):
+        self.prefix = prefix
+        self.block_records = block_records
+        self._buf = array('i', bytes(RECORD_SIZE * block_records))
+        self._n = 0
+        self._file = None
+        self._start_ms = 0
+        self.name = None
+        self.records = 0
+        self.blocks = 0
+        self._last1 = 0
+        self._last2 = 0
+        self._last_mode = -1
+
+    def recording(self):
+        return self._file is not None
+
+    def _next_name(self):
+        index = 0
+        while True:
+            name = "%s%d.bin" % (self.prefix, index)
+            try:
+                os.stat(name)
+            except OSError:
+                return name
+            index += 1
+
+    def start(self):
+        """
+        Starts a new session file.
+
+        Returns:
+            str: The file name.
+        """
+        if self._file is not None:
+            self.stop()
+        self.name = self._next_name()
+        self._file = open(self.name, 'wb')
+        self._file.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION,
+                                     RECORD_SIZE, self.block_records))
+        self._n = 0
+        self._start_ms = utime.ticks_ms()
+        self._last_mode = -1
+        self.records = 0
+        self.blocks = 0
+        return self.name
+
+    def stop(self):
+        """
+        Writes the buffered records and closes the session.
+        """
+        if self._file is None:
+            return
+        self._flush()
+        self._file.close()
+        self._file = None
+
+    def _flush(self):
+        if self._n:
+            self._file.write(memoryview(self._buf)[:self._n * FIELDS])
+            self._n = 0
+            self.blocks += 1
+
+    def _add(self, val1, val2, tag):
+        if self._file is None:
+            return
+        buf = self._buf
+        i = self._n * FIELDS
+        buf[i] = utime.ticks_diff(utime.ticks_ms(), self._start_ms)
+        buf[i + 1] = val1
+        buf[i + 2] = val2
+        buf[i + 3] = tag
+        self._n += 1
+        self.records += 1
+        if self._n == self.block_records:
+            self._flush()
+
+    def sample(self, val1, val2, mode):
+        """
+        Records the encoder values if a session is running and they or the
+        mode changed since the last sample.
+        """
+        if (val1 == self._last1 and val2 == self._last2 and
+                mode == self._last_mode):
+            return
+        self._last1 = val1
+        self._last2 = val2
+        self._last_mode = mode
+        self._add(val1, val2, SAMPLE << 8 | mode)
+
+    def event(self, val1, val2, event):
+        """
+        Records a button event, if a session is running.
+        """
+        self._add(val1, val2, EVENT << 8 | event)
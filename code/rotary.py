@@ -8,6 +8,8 @@
 #   https://github.com/MikeTeachman/micropython-rotary
 
 import micropython
+import time
+from array import array
 
 _DIR_CW = const(0x10)  # Clockwise step
 _DIR_CCW = const(0x20)  # Counter-clockwise step
@@ -49,6 +51,21 @@ _transition_table_half_step = [
 _STATE_MASK = const(0x07)
 _DIR_MASK = const(0x30)
 
+# Encoder health stats, see Rotary.enable_stats()
+_COUNT_MASK = const(0x3fffffff)  # keeps the counters small ints
+_RATE_WINDOW_MS = const(100)     # the edge rate is counted over this long
+
+
+def _flatten(table, invert):
+    # Flattens a transition table into bytes indexed by (state << 2) | pins,
+    # with the pin inversion already applied to the index
+    flat = bytearray(len(table) * 4)
+    for state in range(len(table)):
+        for clk_dt_pins in range(4):
+            src = (~clk_dt_pins & 0x03) if invert else clk_dt_pins
+            flat[(state << 2) | clk_dt_pins] = table[state][src]
+    return bytes(flat)
+
 
 def _wrap(value, incr, lower_bound, upper_bound):
     range = upper_bound - lower_bound + 1
@@ -64,9 +81,12 @@ def _bound(value, incr, lower_bound, upper_bound):
     return min(upper_bound, max(lower_bound, value + incr))
 
 
-def _trigger(rotary_instance):
-    for listener in rotary_instance._listener:
-        listener()
+# Fields of a listener record
+_L_CALLBACK = const(0)
+_L_MIN_DELTA = const(1)
+_L_MIN_INTERVAL = const(2)
+_L_DELTA = const(3)
+_L_LAST_MS = const(4)
 
 
 class Rotary(object):
@@ -85,12 +105,52 @@ class Rotary(object):
         self._state = _R_START
         self._half_step = half_step
         self._invert = invert
+        # Edges are always decoded, but steps are only counted while this
+        # is set, see pause()
+        self._counting = True
+        # The IRQ handler, bound once so installing it doesn't allocate.
+        # enable_stats() swaps in a measuring one.
+        self._handler = self._process_rotary_pins
+        self._stats_on = False
+        self.reset_stats()
         self._listener = []
+        # Listener dispatch, deferred out of the IRQ with micropython.schedule
+        self._dispatch_ref = self._dispatch
+        self._dispatch_pending = False
+        self._pending_delta = 0
+        # One shot timer that runs the dispatch again for a delta held back
+        # by min_interval_ms, created when first needed
+        self._defer_timer = None
+        self.reset_notify_stats()
+        # Optional ring buffer of step timestamps, see enable_edge_log()
+        self._log_ticks = None
+        self._log_dirs = None
+        self._log_size = 0
+        self._log_mask = 0
+        self._log_head = 0
+        self._log_tail = 0
+        self._log_overflows = 0
+        self._configure()
+
+    def _configure(self):
+        # Resolves everything the interrupt handler would otherwise branch
+        # on: the transition table for half_step/invert, and the signed
+        # increment for each direction.
+        if self._half_step:
+            self._table = _flatten(_transition_table_half_step, self._invert)
+        else:
+            self._table = _flatten(_transition_table, self._invert)
+        self._incr_cw = self._incr * self._reverse
+        self._incr_ccw = -self._incr * self._reverse
+        # Where the decoder waits between steps, besides _R_START
+        self._rest = _R_CW_3 if self._half_step else _R_START
 
     def set(self, value=None, min_val=None, incr=None,
             max_val=None, reverse=None, range_mode=None):
-        # disable DT and CLK pin interrupts
-        self._hal_disable_irq()
+        # Steps are not counted while the fields change, but the IRQ stays
+        # installed and keeps tracking the decoder state
+        counting = self._counting
+        self._counting = False
 
         if value is not None:
             self._value = value
@@ -104,10 +164,23 @@ class Rotary(object):
             self._reverse = -1 if reverse else 1
         if range_mode is not None:
             self._range_mode = range_mode
-        self._state = _R_START
+        self._configure()
 
-        # enable DT and CLK pin interrupts
-        self._hal_enable_irq()
+        self._counting = counting
+
+    def pause(self):
+        # Stops counting steps without touching the pin IRQs: edges are
+        # still decoded, so resume() continues from the true decoder state
+        # instead of half way through a step. Cheaper than
+        # _hal_disable_irq(), which re-registers the handlers.
+        self._counting = False
+
+    def resume(self):
+        # Counts steps again after pause()
+        self._counting = True
+
+    def paused(self):
+        return not self._counting
 
     def value(self):
         return self._value
@@ -116,40 +189,232 @@ class Rotary(object):
         self._value = 0
 
     def close(self):
+        if self._defer_timer is not None:
+            self._defer_timer.deinit()
         self._hal_close()
 
-    def add_listener(self, l):
-        self._listener.append(l)
+    def add_listener(self, l, min_delta=0, min_interval_ms=0):
+        # l(delta) is called outside the IRQ with the change in value since
+        # its previous call. It is held back until abs(delta) >= min_delta
+        # and min_interval_ms has passed since the previous call; what is
+        # held back is delivered with a later tick, or once min_interval_ms
+        # has passed; see flush() for what min_delta holds back.
+        self._listener.append([l, min_delta, min_interval_ms, 0,
+                               time.ticks_add(time.ticks_ms(),
+                                              -min_interval_ms)])
 
     def remove_listener(self, l):
-        if l not in self._listener:
-            raise ValueError('{} is not an installed listener'.format(l))
-        self._listener.remove(l)
+        for record in self._listener:
+            if record[_L_CALLBACK] == l:
+                self._listener.remove(record)
+                return
+        raise ValueError('{} is not an installed listener'.format(l))
+
+    def enable_edge_log(self, size=64):
+        # Records (ticks_us, direction) for every decoded step into a
+        # preallocated ring of size entries (rounded up to a power of two),
+        # to be drained with drain_edges(). direction is +1 when the value
+        # stepped up and -1 when it stepped down. size=0 disables the log.
+        if size <= 0:
+            self._log_ticks = None
+            return
+        n = 1
+        while n < size:
+            n <<= 1
+        self._log_dirs = array('b', bytes(n))
+        self._log_size = n
+        # Indices run modulo 2 * size to tell a full ring from an empty one
+        self._log_mask = 2 * n - 1
+        self._log_head = 0
+        self._log_tail = 0
+        self._log_overflows = 0
+        self._log_ticks = array('i', bytes(4 * n))
+
+    def drain_edges(self, ticks_out, dirs_out):
+        # Moves up to min(len(ticks_out), len(dirs_out)) logged steps, oldest
+        # first, into the caller's buffers and returns how many were moved.
+        # Only the consumer moves the tail, so this is safe against the IRQ.
+        if self._log_ticks is None:
+            return 0
+        limit = min(len(ticks_out), len(dirs_out))
+        tail = self._log_tail
+        available = (self._log_head - tail) & self._log_mask
+        count = min(available, limit)
+        for i in range(count):
+            j = (tail + i) & (self._log_size - 1)
+            ticks_out[i] = self._log_ticks[j]
+            dirs_out[i] = self._log_dirs[j]
+        self._log_tail = (tail + count) & self._log_mask
+        return count
+
+    def edge_log_stats(self):
+        # Returns (pending, overflows): logged steps not drained yet, and
+        # steps that found the ring full and were not logged.
+        return ((self._log_head - self._log_tail) & self._log_mask,
+                self._log_overflows)
+
+    def notify_stats(self):
+        # Returns (scheduled, merged, dropped, errors): dispatches scheduled,
+        # ticks merged into an already pending dispatch, dispatches lost to
+        # a full schedule queue (their delta is carried to the next one) and
+        # exceptions raised by listeners.
+        return (self._scheduled, self._merged, self._dropped, self._errors)
+
+    def reset_notify_stats(self):
+        self._scheduled = 0
+        self._merged = 0
+        self._dropped = 0
+        self._errors = 0
+        self.last_listener_error = None
+
+    def enable_stats(self, on=True):
+        # Keeps the health counters returned by stats(), by installing an
+        # IRQ handler that measures around the decoder. Off by default, and
+        # when off the decoder runs without any measuring code at all.
+        self.reset_stats()
+        self._stats_on = on
+        if on:
+            self._handler = self._process_rotary_pins_stats
+        else:
+            self._handler = self._process_rotary_pins
+        self._hal_enable_irq()
+
+    def stats_enabled(self):
+        return self._stats_on
+
+    def stats(self):
+        # Returns (edges, steps, aborted, peak edges/s, min us, avg us,
+        # max us) since enable_stats() or reset_stats(). Steps are decoded
+        # steps, counted or not. aborted are edges that sent the decoder
+        # back to rest without a step, which bounce and missed edges do.
+        # The times are spent in the IRQ handler, as seen from inside it.
+        count = self._isr_count
+        peak = max(self._peak_edges, self._rate_edges)
+        return (self._edges, self._steps, self._aborted,
+                peak * 1000 // _RATE_WINDOW_MS,
+                self._isr_min if count else 0,
+                self._isr_total // count if count else 0,
+                self._isr_max)
+
+    def reset_stats(self):
+        self._edges = 0
+        self._steps = 0
+        self._aborted = 0
+        self._isr_min = _COUNT_MASK
+        self._isr_max = 0
+        self._isr_total = 0
+        self._isr_count = 0
+        self._rate_start = time.ticks_ms()
+        self._rate_edges = 0
+        self._peak_edges = 0
+
+    def _dispatch(self, _):
+        # Runs from the scheduler, never inside the pin IRQ. With hard IRQs
+        # an edge can interrupt it, so the pending delta is taken with the
+        # IRQs off, as in flush().
+        from machine import disable_irq, enable_irq
+        irq_state = disable_irq()
+        self._dispatch_pending = False
+        delta = self._pending_delta
+        self._pending_delta = 0
+        enable_irq(irq_state)
+        now = time.ticks_ms()
+        wait = -1
+        for record in self._listener:
+            record[_L_DELTA] += delta
+            if (abs(record[_L_DELTA]) < record[_L_MIN_DELTA] or
+                    record[_L_DELTA] == 0):
+                continue
+            left = record[_L_MIN_INTERVAL] - time.ticks_diff(
+                now, record[_L_LAST_MS])
+            if left > 0:
+                # Held back only by the interval: without a later tick it
+                # would never be delivered, so come back for it
+                if wait < 0 or left < wait:
+                    wait = left
+                continue
+            self._deliver(record, now)
+        if wait > 0:
+            self._defer_dispatch(wait)
+
+    def _deliver(self, record, now):
+        delta_out = record[_L_DELTA]
+        record[_L_DELTA] = 0
+        record[_L_LAST_MS] = now
+        try:
+            record[_L_CALLBACK](delta_out)
+        except Exception as e:
+            # An exception here would surface in whatever the main
+            # thread happens to be running, so count it instead
+            self._errors += 1
+            self.last_listener_error = e
+
+    def _defer_dispatch(self, delay_ms):
+        if self._defer_timer is None:
+            from machine import Timer
+            self._defer_timer = Timer()
+        timer = self._defer_timer
+        timer.init(mode=timer.ONE_SHOT, period=delay_ms,
+                   callback=self._on_defer_timer)
+
+    def _on_defer_timer(self, timer):
+        # The timer may fire in hard IRQ context on some ports, so the
+        # listeners run from the scheduler as usual
+        if self._dispatch_pending:
+            return
+        try:
+            micropython.schedule(self._dispatch_ref, 0)
+        except RuntimeError:
+            self._defer_dispatch(1)
+            return
+        self._dispatch_pending = True
+
+    def flush(self):
+        # Delivers what every listener still has held back, whatever its
+        # min_delta and min_interval_ms, e.g. once the wheel has stopped.
+        # Call it outside the IRQ.
+        from machine import disable_irq, enable_irq
+        irq_state = disable_irq()
+        delta = self._pending_delta
+        self._pending_delta = 0
+        enable_irq(irq_state)
+        now = time.ticks_ms()
+        for record in self._listener:
+            record[_L_DELTA] += delta
+            if record[_L_DELTA] != 0:
+                self._deliver(record, now)
+
+    def _notify(self, delta):
+        # Called in the IRQ. Accumulates the delta and schedules one
+        # dispatch for any number of ticks that arrive before it runs.
+        self._pending_delta += delta
+        if self._dispatch_pending:
+            self._merged += 1
+            return
+        try:
+            micropython.schedule(self._dispatch_ref, 0)
+        except RuntimeError:
+            self._dropped += 1
+            return
+        self._dispatch_pending = True
+        self._scheduled += 1
         
+    @micropython.native
     def _process_rotary_pins(self, pin):
+        # The IRQ handler. Returns the transition table entry of the edge,
+        # for _process_rotary_pins_stats().
+        state = self._table[(self._state << 2) |
+                            (self._hal_get_clk_value() << 1) |
+                            self._hal_get_dt_value()]
+        self._state = state & _STATE_MASK
+        if not state & _DIR_MASK or not self._counting:
+            return state
+
         old_value = self._value
-        clk_dt_pins = (self._hal_get_clk_value() <<
-                       1) | self._hal_get_dt_value()
-                       
-        if self._invert:
-            clk_dt_pins = ~clk_dt_pins & 0x03
-            
-        # Determine next state
-        if self._half_step:
-            self._state = _transition_table_half_step[self._state &
-                                                      _STATE_MASK][clk_dt_pins]
+        if state & _DIR_CW:
+            incr = self._incr_cw
         else:
-            self._state = _transition_table[self._state &
-                                            _STATE_MASK][clk_dt_pins]
-        direction = self._state & _DIR_MASK
-
-        incr = 0
-        if direction == _DIR_CW:
-            incr = self._incr
-        elif direction == _DIR_CCW:
-            incr = -self._incr
-
-        incr *= self._reverse
+            incr = self._incr_ccw
 
         if self._range_mode == self.RANGE_WRAP:
             self._value = _wrap(
@@ -166,8 +431,55 @@ class Rotary(object):
         else:
             self._value = self._value + incr
 
-        try:
-            if old_value != self._value and len(self._listener) != 0:
-                _trigger(self)
-        except:
-            pass
+        log = self._log_ticks
+        if log is not None:
+            head = self._log_head
+            if ((head - self._log_tail) & self._log_mask) == self._log_size:
+                self._log_overflows += 1
+            else:
+                i = head & (self._log_size - 1)
+                log[i] = time.ticks_us()
+                self._log_dirs[i] = 1 if incr > 0 else -1
+                self._log_head = (head + 1) & self._log_mask
+
+        if old_value != self._value and len(self._listener) != 0:
+            if self._range_mode == self.RANGE_BOUNDED:
+                self._notify(self._value - old_value)
+            else:
+                self._notify(incr)
+        return state
+
+    @micropython.native
+    def _process_rotary_pins_stats(self, pin):
+        # The IRQ handler while stats are on: runs the decoder and
+        # classifies the edge by the transition it made.
+        start = time.ticks_us()
+        old = self._state
+        state = self._process_rotary_pins(pin)
+
+        self._edges = (self._edges + 1) & _COUNT_MASK
+        new = state & _STATE_MASK
+        if state & _DIR_MASK:
+            self._steps = (self._steps + 1) & _COUNT_MASK
+        elif new != old and (new == _R_START or new == self._rest or
+                             new == _R_ILLEGAL):
+            self._aborted = (self._aborted + 1) & _COUNT_MASK
+
+        now = time.ticks_ms()
+        if time.ticks_diff(now, self._rate_start) >= _RATE_WINDOW_MS:
+            if self._rate_edges > self._peak_edges:
+                self._peak_edges = self._rate_edges
+            self._rate_start = now
+            self._rate_edges = 0
+        self._rate_edges += 1
+
+        elapsed = time.ticks_diff(time.ticks_us(), start)
+        if elapsed < self._isr_min:
+            self._isr_min = elapsed
+        if elapsed > self._isr_max:
+            self._isr_max = elapsed
+        self._isr_total += elapsed
+        self._isr_count += 1
+        if self._isr_total > _COUNT_MASK:
+            self._isr_total >>= 1
+            self._isr_count >>= 1
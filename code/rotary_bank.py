@@ -0,0 +1,166 @@
+"""
+A group of rotary encoders read and controlled together.
+
+Each encoder is a RotaryIRQ whose IRQ handler also copies its value into
+one shared array, inside a sequence lock: the handler makes the sequence
+odd while it writes, and snapshot() retries until it copied all counts
+between two reads of the same even sequence. So the counts of all wheels
+in a snapshot are from one instant, which two value() calls in a row
+can't promise, and reading never blocks an IRQ or allocates.
+
+reset(), pause() and resume() act on the whole group, or on the encoders
+selected by a bit mask, bit i for encoder i. Pausing gates the counting
+with Rotary.pause(), the IRQs stay installed.
+"""
+
+import machine
+import micropython
+from array import array
+from rotary import Rotary
+from rotary_irq_rp2 import RotaryIRQ
+
+SEQ_MASK = 0x3fffffff   # keeps the sequence a small int
+
+
+class _Member(RotaryIRQ):
+    # An encoder of a bank, publishing its value to the bank's counts
+
+    def __init__(self, bank, index, pin_num_clk, pin_num_dt, **kwargs):
+        # Set before RotaryIRQ enables the IRQ
+        self._bank = bank
+        self._index = index
+        super().__init__(pin_num_clk, pin_num_dt, **kwargs)
+
+    @micropython.native
+    def _process_rotary_pins(self, pin):
+        # Runs on every edge, native like the decoder it wraps
+        bank = self._bank
+        bank._seq = (bank._seq + 1) & SEQ_MASK
+        state = Rotary._process_rotary_pins(self, pin)
+        bank.counts[self._index] = self._value
+        bank._seq = (bank._seq + 1) & SEQ_MASK
+        return state
+
+    def _publish(self):
+        # Copies a value set outside the IRQ handler into the bank's counts
+        bank = self._bank
+        bank._seq = (bank._seq + 1) & SEQ_MASK
+        bank.counts[self._index] = self._value
+        bank._seq = (bank._seq + 1) & SEQ_MASK
+
+    def set(self, *args, **kwargs):
+        irq_state = machine.disable_irq()
+        Rotary.set(self, *args, **kwargs)
+        self._publish()
+        machine.enable_irq(irq_state)
+
+    def reset(self):
+        irq_state = machine.disable_irq()
+        Rotary.reset(self)
+        self._publish()
+        machine.enable_irq(irq_state)
+
+
+class RotaryBank:
+    """
+    Args:
+        pins (tuple): (clk, dt) pins of each encoder.
+        **kwargs: Passed to RotaryIRQ for every encoder, e.g. pull_up,
+            edge_log_size or hard_irq.
+    """
+    def __init__(self, pins, **kwargs):
+        n = len(pins)
+        self.counts = array('i', bytes(4 * n))
+        self._seq = 0
+        self.retries = 0
+        self.all = (1 << n) - 1
+        self.enabled = self.all
+        self.rotaries = [_Member(self, i, clk, dt, **kwargs)
+                         for i, (clk, dt) in enumerate(pins)]
+
+    def __len__(self):
+        return len(self.rotaries)
+
+    def snapshot(self, out):
+        """
+        Copies the counts of all encoders, taken at one instant, into out.
+
+        Args:
+            out (array): At least len(self) entries.
+
+        Returns:
+            int: The sequence of the copy, even. It only changes when a
+            count may have changed.
+        """
+        counts = self.counts
+        n = len(counts)
+        while True:
+            seq = self._seq
+            if not seq & 1:
+                for i in range(n):
+                    out[i] = counts[i]
+                if self._seq == seq:
+                    return seq
+            self.retries += 1
+
+    def reset(self, mask=None):
+        """
+        Sets the counts of the encoders in mask, default all, to zero.
+        """
+        if mask is None:
+            mask = self.all
+        irq_state = machine.disable_irq()
+        self._seq = (self._seq + 1) & SEQ_MASK
+        for i, rotary in enumerate(self.rotaries):
+            if mask >> i & 1:
+                Rotary.reset(rotary)
+                self.counts[i] = 0
+        self._seq = (self._seq + 1) & SEQ_MASK
+        machine.enable_irq(irq_state)
+
+    def pause(self, mask=None):
+        """
+        Stops counting on the encoders in mask, default all.
+        """
+        if mask is None:
+            mask = self.all
+        for i, rotary in enumerate(self.rotaries):
+            if mask >> i & 1:
+                rotary.pause()
+        self.enabled &= ~mask
+
+    def resume(self, mask=None):
+        """
+        Counts on the encoders in mask, default all, and pauses the others.
+        """
+        if mask is None:
+            mask = self.all
+        for i, rotary in enumerate(self.rotaries):
+            if mask >> i & 1:
+                rotary.resume()
+            else:
+                rotary.pause()
+        self.enabled = mask & self.all
+
+    def enable_stats(self, on=True):
+        """
+        Turns the health counters of all encoders on or off, see
+        Rotary.enable_stats().
+        """
+        for rotary in self.rotaries:
+            rotary.enable_stats(on)
+
+    def reset_stats(self):
+        """
+        Clears the health counters of all encoders.
+        """
+        for rotary in self.rotaries:
+            rotary.reset_stats()
+
+    def close(self):
+        """
+        Releases the pins of all encoders.
+        """
+        for rotary in self.rotaries:
+            rotary.close()
+        self.enabled = 0
@@ -27,9 +27,15 @@ class RotaryIRQ(Rotary):
         range_mode=Rotary.RANGE_UNBOUNDED,
         pull_up=False,
         half_step=False,
-        invert=False
+        invert=False,
+        edge_log_size=0,
+        hard_irq=False
     ):
         super().__init__(min_val, max_val, incr, reverse, range_mode, half_step, invert)
+        self.enable_edge_log(edge_log_size)
+        # Hard IRQs run on the core that registered them, without waiting
+        # for the scheduler of the other core
+        self._hard_irq = hard_irq
 
         if pull_up:
             self._pin_clk = Pin(pin_num_clk, Pin.IN, Pin.PULL_UP)
@@ -41,10 +47,12 @@ class RotaryIRQ(Rotary):
         self._hal_enable_irq()
 
     def _enable_clk_irq(self):
-        self._pin_clk.irq(self._process_rotary_pins, IRQ_RISING_FALLING)
+        self._pin_clk.irq(self._handler, IRQ_RISING_FALLING,
+                          hard=self._hard_irq)
 
     def _enable_dt_irq(self):
-        self._pin_dt.irq(self._process_rotary_pins, IRQ_RISING_FALLING)
+        self._pin_dt.irq(self._handler, IRQ_RISING_FALLING,
+                         hard=self._hard_irq)
 
     def _disable_clk_irq(self):
         self._pin_clk.irq(None, 0)
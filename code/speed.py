@@ -0,0 +1,161 @@
+"""
+Wheel speed estimation from the rotary encoder step log.
+
+At low speed there are only a few steps per window and counting them gives
+a coarse, jumpy rate, so the time between the last two steps (the period
+method) is used instead. At high speed the period of single steps is noisy
+and the step count over a window is better. The two estimates are blended
+linearly between low_steps and high_steps steps per window.
+
+All arithmetic is integer. Speeds are in milli-steps per second, signed
+like the encoder value.
+"""
+
+import time
+from array import array
+
+WINDOW_MS = 250     # count method window
+LOW_STEPS = 2       # at or below this many steps per window use the period
+HIGH_STEPS = 8      # at or above this many steps per window use the count
+STOP_MS = 500       # no step for this long means standing still
+BATCH = 16          # steps drained from the encoder log at a time
+
+
+def _rate(steps, elapsed_us):
+    # steps / elapsed_us in milli-steps per second without exceeding small
+    # int range for the step counts seen in one window
+    n = abs(steps)
+    q, r = divmod(n * 1000000, elapsed_us)
+    rate = q * 1000 + r * 1000 // elapsed_us
+    return rate if steps >= 0 else -rate
+
+
+class SpeedEstimator:
+    """
+    Hybrid period/count speed estimator for one encoder. Each step is
+    processed in O(1).
+    """
+    def __init__(self, window_ms=WINDOW_MS, low_steps=LOW_STEPS,
+                 high_steps=HIGH_STEPS, stop_ms=STOP_MS, batch=BATCH):
+        self.window_us = window_ms * 1000
+        self.low_steps = low_steps
+        self.high_steps = high_steps
+        self.stop_us = stop_ms * 1000
+        self._ticks = array('i', bytes(4 * batch))
+        self._dirs = array('b', bytes(batch))
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets all steps, e.g. after the encoders were paused.
+        """
+        self._started = False
+        self._last_us = 0
+        self._last_dir = 0
+        self._period_us = 0
+        self._window_start = 0
+        self._window_steps = 0
+        self._window_net = 0
+        self._count_steps = 0
+        self._count_speed = 0
+
+    def step(self, ticks_us, direction):
+        """
+        Adds one encoder step.
+
+        Args:
+            ticks_us (int): utime.ticks_us() of the step.
+            direction (int): +1 or -1.
+        """
+        if self._started:
+            if direction == self._last_dir:
+                self._period_us = time.ticks_diff(ticks_us, self._last_us)
+            else:
+                # A reversal says nothing about the period
+                self._period_us = 0
+        else:
+            # The first step only opens the window, it ends no interval
+            self._started = True
+            self._window_start = ticks_us
+            self._last_us = ticks_us
+            self._last_dir = direction
+            return
+        self._last_us = ticks_us
+        self._last_dir = direction
+        self._window_steps += 1
+        self._window_net += direction
+        self._roll(ticks_us)
+
+    def feed(self, rotary):
+        """
+        Drains the step log of a Rotary (see Rotary.enable_edge_log) into
+        the estimator.
+
+        Returns:
+            int: Number of steps processed.
+        """
+        total = 0
+        count = rotary.drain_edges(self._ticks, self._dirs)
+        while count:
+            for i in range(count):
+                self.step(self._ticks[i], self._dirs[i])
+            total += count
+            count = rotary.drain_edges(self._ticks, self._dirs)
+        return total
+
+    def _roll(self, now_us):
+        # Closes the count window at the first step after it has lasted
+        # window_us. Windows start and end on a step, so they hold a whole
+        # number of step intervals.
+        elapsed = time.ticks_diff(now_us, self._window_start)
+        if elapsed >= self.window_us:
+            self._count_speed = _rate(self._window_net, elapsed)
+            self._count_steps = self._window_steps
+            self._window_start = now_us
+            self._window_steps = 0
+            self._window_net = 0
+
+    def speed(self, now_us=None):
+        """
+        Returns the current speed in milli-steps per second.
+
+        Args:
+            now_us (int): utime.ticks_us() to evaluate at, default now.
+        """
+        if not self._started:
+            return 0
+        if now_us is None:
+            now_us = time.ticks_us()
+        since = time.ticks_diff(now_us, self._last_us)
+        if since >= self.stop_us:
+            return 0
+
+        period_speed = 0
+        if self._period_us > 0:
+            # The next step can't be faster than the time already waited
+            period = max(self._period_us, since)
+            period_speed = self._last_dir * (1000000000 // period)
+
+        n = self._count_steps
+        if since >= self.window_us:
+            # The last count window is stale, the wheel is slowing down
+            n = 0
+        if n <= self.low_steps:
+            return period_speed
+        if n >= self.high_steps:
+            return self._count_speed
+        weight = ((n - self.low_steps) << 8) // (self.high_steps - self.low_steps)
+        return (period_speed * (256 - weight) + self._count_speed * weight) >> 8
+
+
+def combined_speed(estimators, now_us=None):
+    """
+    Returns the average speed of the given estimators, in milli-steps per
+    second, matching how the distance averages both wheels.
+    """
+    if now_us is None:
+        now_us = time.ticks_us()
+    total = 0
+    for estimator in estimators:
+        total += estimator.speed(now_us)
+    return total // len(estimators)
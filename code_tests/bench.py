@@ -0,0 +1,776 @@
+"""
+Benchmarks for the display, encoder and main loop hot paths.
+
+Runs on the host against the stand-ins in host/ (time is accounted with a
+virtual clock, so sleeps and estimated I2C bus time are included without
+blocking) and on the Pico under MicroPython against the real display:
+
+    host:   python code_tests/bench.py [--save] [--baseline FILE] [NAME ...]
+    device: import bench; bench.run()
+
+Every benchmark reports wall time per operation and, where it applies,
+I2C transactions and bytes per operation or ISR calls per encoder step.
+Results are compared against a baseline file when one is given.
+"""
+
+import sys
+
+ON_DEVICE = sys.implementation.name == 'micropython'
+
+if not ON_DEVICE:
+    import os
+    _ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.path.join(_ROOT, 'host'))
+    import hostenv
+    hostenv.install(virtual_time=True)
+    BASELINE_FILE = os.path.join(_ROOT, 'code_tests', 'bench_baseline.json')
+else:
+    BASELINE_FILE = 'bench_baseline.json'
+
+import json
+from array import array
+import utime
+from machine import I2C, Pin
+from pico_i2c_lcd import I2cLcd
+from lcd_framebuffer import LcdFrameBuffer
+import rotary
+from rotary import Rotary
+import app as fox
+from big_digits import BigDigits
+from lcd_queue import LcdQueue
+from logger import Logger, OFF, INFO
+from rotary_bank import RotaryBank
+from rotary_irq_rp2 import RotaryIRQ
+
+# Quadrature sequences (CLK, DT) for one full step from the idle 11 state
+CW_EDGES = ((1, 0), (0, 0), (0, 1), (1, 1))
+CCW_EDGES = ((0, 1), (0, 0), (1, 0), (1, 1))
+
+_benchmarks = []
+
+
+def bench(name):
+    """
+    Registers a benchmark. The function gets the shared context and returns
+    a dict of metrics.
+    """
+    def register(func):
+        _benchmarks.append((name, func))
+        return func
+    return register
+
+
+class CountingI2C:
+    """
+    Wraps an I2C bus and counts the transactions and bytes written to it.
+    """
+    def __init__(self, i2c):
+        self.i2c = i2c
+        self.transactions = 0
+        self.bytes = 0
+
+    def writeto(self, addr, buf, stop=True):
+        self.transactions += 1
+        self.bytes += len(buf)
+        return self.i2c.writeto(addr, buf, stop)
+
+    def reset(self):
+        self.transactions = 0
+        self.bytes = 0
+
+
+class SimRotary(Rotary):
+    """
+    Rotary decoder fed from software pin levels, so the decoder can be
+    driven the same way on the host and on the device.
+    """
+    def __init__(self, half_step=False):
+        super().__init__(0, 10, 1, False, Rotary.RANGE_UNBOUNDED, half_step, False)
+        self.clk = 1
+        self.dt = 1
+        self.isr_calls = 0
+
+    def edge(self, clk, dt):
+        self.clk = clk
+        self.dt = dt
+        self.isr_calls += 1
+        self._handler(None)
+
+    def _hal_get_clk_value(self):
+        return self.clk
+
+    def _hal_get_dt_value(self):
+        return self.dt
+
+    def _hal_enable_irq(self):
+        pass
+
+    def _hal_disable_irq(self):
+        pass
+
+    def _hal_close(self):
+        pass
+
+
+class LegacyRotary(SimRotary):
+    """
+    The nested-list decoder Rotary used before the flat transition table,
+    kept as the reference the fast path is checked against.
+    """
+    def _process_rotary_pins(self, pin):
+        old_value = self._value
+        clk_dt_pins = (self._hal_get_clk_value() <<
+                       1) | self._hal_get_dt_value()
+        if self._invert:
+            clk_dt_pins = ~clk_dt_pins & 0x03
+        if self._half_step:
+            self._state = rotary._transition_table_half_step[self._state &
+                                                             0x07][clk_dt_pins]
+        else:
+            self._state = rotary._transition_table[self._state &
+                                                   0x07][clk_dt_pins]
+        direction = self._state & 0x30
+
+        incr = 0
+        if direction == 0x10:
+            incr = self._incr
+        elif direction == 0x20:
+            incr = -self._incr
+
+        incr *= self._reverse
+
+        if self._range_mode == self.RANGE_WRAP:
+            self._value = rotary._wrap(self._value, incr,
+                                       self._min_val, self._max_val)
+        elif self._range_mode == self.RANGE_BOUNDED:
+            self._value = rotary._bound(self._value, incr,
+                                        self._min_val, self._max_val)
+        else:
+            self._value = self._value + incr
+
+
+def timed(op, count):
+    """
+    Calls op() count times and returns the average time per call in us.
+    """
+    start = utime.ticks_us()
+    for _ in range(count):
+        op()
+    return utime.ticks_diff(utime.ticks_us(), start) / count
+
+
+def per_op(ctx, op, count):
+    """
+    Runs op() count times and returns wall time, transactions and bytes
+    per operation.
+    """
+    i2c = ctx["i2c"]
+    i2c.reset()
+    time_us = timed(op, count)
+    return {
+        "time_us": round(time_us, 1),
+        "transactions": i2c.transactions / count,
+        "bytes": i2c.bytes / count,
+    }
+
+
+class _Quiet:
+    """
+    Silences print() from the main loop while it is benchmarked on the
+    host. On the device the output goes through unchanged.
+    """
+    def __enter__(self):
+        if not ON_DEVICE:
+            self._stdout = sys.stdout
+            sys.stdout = open(os.devnull, 'w')
+
+    def __exit__(self, *exc):
+        if not ON_DEVICE:
+            sys.stdout.close()
+            sys.stdout = self._stdout
+
+
+def make_context():
+    i2c = CountingI2C(I2C(1, sda=Pin(fox.PIN_SDA), scl=Pin(fox.PIN_SCL),
+                          freq=400000))
+    lcd = I2cLcd(i2c, fox.I2C_ADDR, fox.I2C_NUM_ROWS, fox.I2C_NUM_COLS,
+                 gc_policy=fox.GC_LOW_MEM, gc_threshold=fox.LCD_GC_THRESHOLD)
+    return {"i2c": i2c, "lcd": lcd}
+
+
+@bench("lcd_putstr_line")
+def bench_putstr(ctx):
+    lcd = ctx["lcd"]
+
+    def op():
+        lcd.move_to(0, 0)
+        lcd.putstr("Distance pushed:")
+    return per_op(ctx, op, 20)
+
+
+@bench("lcd_putstr_fast_line")
+def bench_putstr_fast(ctx):
+    lcd = ctx["lcd"]
+
+    def op():
+        lcd.move_to(0, 0)
+        lcd.putstr_fast("Distance pushed:")
+    return per_op(ctx, op, 20)
+
+
+@bench("lcd_clear")
+def bench_clear(ctx):
+    return per_op(ctx, ctx["lcd"].clear, 10)
+
+
+@bench("frame_full_redraw")
+def bench_full_redraw(ctx):
+    fb = LcdFrameBuffer(ctx["lcd"])
+
+    def op():
+        fb.invalidate()
+        fox.reset_lcd(fb, 0)
+    return per_op(ctx, op, 10)
+
+
+@bench("frame_distance_update")
+def bench_distance_update(ctx):
+    fb = LcdFrameBuffer(ctx["lcd"])
+    fox.reset_lcd(fb, 0)
+    ticks = [0]
+
+    def op():
+        ticks[0] += 1
+        fox.lcd_update_distance(fb, ticks[0] * fox.DISTANCE_NUM
+                                // fox.DISTANCE_DEN)
+    return per_op(ctx, op, 50)
+
+
+@bench("lcd_queue")
+def bench_lcd_queue(ctx):
+    # Time the caller is blocked by a full redraw and by a clear, sent
+    # directly and through the queue; the queue is drained outside the
+    # timing, as the timer would
+    lcd = ctx["lcd"]
+    queue = LcdQueue(lcd)
+    direct = LcdFrameBuffer(lcd)
+    queued = LcdFrameBuffer(queue)
+
+    def redraw(fb):
+        fb.invalidate()
+        fox.reset_lcd(fb, 0)
+
+    def queued_us(op, count):
+        total = 0
+        for _ in range(count):
+            total += timed(op, 1)
+            queue.sync()
+        return total / count
+    queue.reset_stats()
+    result = {
+        "redraw_direct_us": round(timed(lambda: redraw(direct), 10), 1),
+        "redraw_queued_us": round(queued_us(lambda: redraw(queued), 10), 1),
+        "clear_direct_us": round(timed(lcd.clear, 5), 1),
+        "clear_queued_us": round(queued_us(queue.clear, 5), 1),
+    }
+    _, max_depth, max_enqueue_us, stalls = queue.stats()
+    result["max_depth"] = max_depth
+    result["max_enqueue_us"] = max_enqueue_us
+    result["stalls"] = stalls
+    return result
+
+
+@bench("big_digit_update")
+def bench_big_digit_update(ctx):
+    # One centimetre per redraw in big digits, which mostly changes the
+    # last digit; the glyphs are uploaded once before the timing
+    fb = LcdFrameBuffer(ctx["lcd"])
+    big = BigDigits(fb)
+    field = fox.BIG_DISTANCE_FIELD
+    width = field.num_width
+    data = memoryview(field.buf)
+    values = [10000000]
+
+    def draw():
+        field.render(values[0])
+        big.draw(data[:width], data[width:])
+        fb.flush()
+    draw()
+    uploads = big.cache.uploads
+
+    def op():
+        values[0] += 10000
+        draw()
+    result = per_op(ctx, op, 50)
+    result["uploads"] = big.cache.uploads - uploads
+    return result
+
+
+@bench("distance_format")
+def bench_distance_format(ctx):
+    # The distance readout rendered by the fixed point field, against the
+    # float f-string it replaced
+    values = [0]
+
+    def field():
+        values[0] += 5237
+        fox.DISTANCE_FIELD.render(values[0])
+
+    def legacy():
+        values[0] += 5237
+        text = f"{values[0] / 1000000:.2f}"
+        if text[0] != '-':
+            text = " " + text
+        if len(text) < 8:
+            text += " "
+        text += "  meters"
+
+    return {
+        "field_us": round(timed(field, 1000), 2),
+        "legacy_us": round(timed(legacy, 1000), 2),
+    }
+
+
+def _odometer_torn_tail(odometer):
+    # Cuts the newest record in half, like a power cut while writing it,
+    # and checks that a record saved after recovery is found on the next
+    # boot
+    from odometer import Odometer, RECORD_SIZE
+    name = odometer._name(odometer._file)
+    with open(name, 'rb') as f:
+        data = f.read()
+    with open(name, 'wb') as f:
+        f.write(data[:len(data) - RECORD_SIZE // 2])
+    torn = Odometer(odometer.prefix, 1)
+    before = torn.recover()
+    torn.save(before[0] + 1000, 1)
+    after = Odometer(odometer.prefix, 1).recover()
+    return after == (before[0] + 1000, 1)
+
+
+@bench("odometer")
+def bench_odometer(ctx):
+    # Appends a full ring of odometer records, then measures the recovery
+    # that runs at boot
+    import os
+    from odometer import Odometer
+    odometer = Odometer("bench_odo", 1)
+    records = odometer.files * odometer.records_per_file
+    half_ticks = [0]
+
+    def write():
+        half_ticks[0] += 1
+        odometer.update(half_ticks[0], 0)
+
+    write_us = timed(write, records + 10)
+    recovered = Odometer("bench_odo", 1)
+    recover_us = timed(recovered.recover, 1)
+    result = {
+        "write_us": round(write_us, 1),
+        "recover_us": round(recover_us, 1),
+        "recover_records_read": recovered.records_read,
+        "recovered_ok": recovered.half_ticks == half_ticks[0],
+        "files_created": odometer.files_created,
+        "write_amplification": round(
+            odometer.estimated_write_amplification(), 2),
+        "torn_tail_ok": _odometer_torn_tail(recovered),
+    }
+    for index in range(odometer.files):
+        try:
+            os.remove(odometer._name(index))
+        except OSError:
+            pass
+    return result
+
+
+@bench("odometry_update")
+def bench_odometry_update(ctx):
+    # One differential odometry update with both wheels moving
+    from odometry import DifferentialOdometry
+    odometry = DifferentialOdometry(fox.TRACK_WIDTH_UM, fox.DISTANCE_NUM,
+                                    fox.DISTANCE_DEN)
+    values = [0, 0]
+
+    def op():
+        values[0] += 2
+        values[1] += 3
+        odometry.update(values[0], values[1])
+
+    return {"time_us": round(timed(op, 1000), 2)}
+
+
+@bench("rotary_decode")
+def bench_rotary(ctx):
+    r = SimRotary()
+    steps = 1000
+
+    def op():
+        for clk, dt in CW_EDGES:
+            r.edge(clk, dt)
+    time_us = timed(op, steps)
+    return {
+        "time_us_per_edge": round(time_us / len(CW_EDGES), 2),
+        "isr_calls_per_step": r.isr_calls / abs(r.value()),
+    }
+
+
+@bench("rotary_decode_legacy")
+def bench_rotary_legacy(ctx):
+    r = LegacyRotary()
+
+    def op():
+        for clk, dt in CW_EDGES:
+            r.edge(clk, dt)
+    return {"time_us_per_edge": round(timed(op, 1000) / len(CW_EDGES), 2)}
+
+
+@bench("rotary_stats")
+def bench_rotary_stats(ctx):
+    # Cost per edge of the health counters, and what they report for
+    # clean steps and for steps with a bounce on CLK before each edge
+    rotary = SimRotary()
+
+    def cycle():
+        for clk, dt in CW_EDGES:
+            rotary.edge(clk, dt)
+    plain = timed(cycle, 500) / 4
+    rotary.enable_stats()
+    measured = timed(cycle, 500) / 4
+    rotary.reset_stats()
+    for _ in range(100):
+        cycle()
+    clean = rotary.stats()
+    rotary.reset_stats()
+    for _ in range(100):
+        rotary.edge(1, 0)
+        rotary.edge(1, 1)   # bounce back to rest
+        cycle()
+    bouncy = rotary.stats()
+    return {
+        "time_us_per_edge": round(plain, 2),
+        "stats_time_us_per_edge": round(measured, 2),
+        "clean_steps": clean[1],
+        "clean_aborted": clean[2],
+        "bouncy_steps": bouncy[1],
+        "bouncy_aborted": bouncy[2],
+        "isr_max_us": bouncy[6],
+    }
+
+
+@bench("rotary_equivalence")
+def bench_rotary_equivalence(ctx):
+    # Feeds every pin sequence of the given length to the fast and the
+    # reference decoder in every configuration and compares value and
+    # state after each edge
+    length = 4 if ON_DEVICE else 6
+    sequences = 0
+    mismatches = 0
+    for half_step in (False, True):
+        for invert in (False, True):
+            for reverse in (False, True):
+                for range_mode in (Rotary.RANGE_UNBOUNDED, Rotary.RANGE_WRAP,
+                                   Rotary.RANGE_BOUNDED):
+                    for seq in range(4 ** length):
+                        fast = SimRotary(half_step)
+                        ref = LegacyRotary(half_step)
+                        for r in (fast, ref):
+                            r._invert = invert
+                            r.set(min_val=-2, max_val=2, incr=2,
+                                  reverse=reverse, range_mode=range_mode)
+                        for i in range(length):
+                            pins = (seq >> (2 * i)) & 0x03
+                            fast.edge(pins >> 1, pins & 1)
+                            ref.edge(pins >> 1, pins & 1)
+                            if (fast.value() != ref.value() or
+                                    fast._state != ref._state & 0x07):
+                                mismatches += 1
+                                break
+                        sequences += 1
+    return {"sequences": sequences, "mismatches": mismatches}
+
+
+def _main_loop_context(ctx):
+    fb = LcdFrameBuffer(ctx["lcd"])
+    if "bank" in ctx:
+        ctx["bank"].close()
+    bank = ctx["bank"] = fox.init_rotaries()
+    r1, r2 = bank.rotaries
+    button = fox.init_button(fox.PIN_BUTTON)
+    state = fox.init_state()
+    fox.use_rotaries(state, bank)
+    with _Quiet():
+        fox.reset_lcd(fb, 0)
+    return fb, r1, r2, button, state
+
+
+@bench("main_loop_idle")
+def bench_loop_idle(ctx):
+    fb, r1, r2, button, state = _main_loop_context(ctx)
+
+    def op():
+        fox.loop_step(fb, r1, r2, button, state)
+    with _Quiet():
+        return per_op(ctx, op, 100)
+
+
+@bench("main_loop_update")
+def bench_loop_update(ctx):
+    fb, r1, r2, button, state = _main_loop_context(ctx)
+
+    def op():
+        # Every iteration lands on a refresh with a new encoder value
+        state["bank"].counts[0] += 1
+        state["i"] = 0
+        fox.loop_step(fb, r1, r2, button, state)
+    with _Quiet():
+        return per_op(ctx, op, 50)
+
+
+@bench("rotary_bank")
+def bench_rotary_bank(ctx):
+    # A consistent read of both wheels against two value() calls, and the
+    # cost per edge of publishing to the bank, against a lone RotaryIRQ.
+    # The edge timings need pins that can be driven, so only on the host.
+    bank = RotaryBank(((Pin(fox.PIN_R1_CLK), Pin(fox.PIN_R1_DT)),
+                       (Pin(fox.PIN_R2_CLK), Pin(fox.PIN_R2_DT))))
+    r1, r2 = bank.rotaries
+    values = array('i', bytes(8))
+    result = {
+        "snapshot_us": round(timed(lambda: bank.snapshot(values), 1000), 2),
+        "value_pair_us": round(timed(lambda: (r1.value(), r2.value()), 1000),
+                               2),
+    }
+    if not ON_DEVICE:
+        clk = Pin(fox.PIN_R1_CLK)
+        dt = Pin(fox.PIN_R1_DT)
+
+        def cycle():
+            for level_clk, level_dt in CW_EDGES:
+                clk.drive(level_clk)
+                dt.drive(level_dt)
+        result["bank_edge_us"] = round(timed(cycle, 500) / 4, 2)
+        bank.close()
+        lone = RotaryIRQ(Pin(fox.PIN_R1_CLK), Pin(fox.PIN_R1_DT))
+        result["lone_edge_us"] = round(timed(cycle, 500) / 4, 2)
+        lone.close()
+    else:
+        bank.close()
+    return result
+
+
+@bench("rotary_pause")
+def bench_rotary_pause(ctx):
+    # Pausing an encoder by gating the counting in the IRQ handler, against
+    # taking the pin IRQs down and installing them again. On the host, also
+    # the steps lost when the wheel is half way through a step at resume.
+    rotary = RotaryIRQ(Pin(fox.PIN_R1_CLK), Pin(fox.PIN_R1_DT))
+
+    def gate():
+        rotary.pause()
+        rotary.resume()
+
+    def reinstall():
+        rotary._hal_disable_irq()
+        rotary._hal_enable_irq()
+    result = {
+        "gate_us": round(timed(gate, 1000), 2),
+        "irq_us": round(timed(reinstall, 1000), 2),
+    }
+    if not ON_DEVICE:
+        clk = Pin(fox.PIN_R1_CLK)
+        dt = Pin(fox.PIN_R1_DT)
+
+        def lost(pause, resume, steps=100):
+            # Half of each step goes by while paused, the other half is
+            # counted, so every step ends after resume and should count
+            rotary.reset()
+            for _ in range(steps):
+                pause()
+                for level_clk, level_dt in CW_EDGES[:2]:
+                    clk.drive(level_clk)
+                    dt.drive(level_dt)
+                resume()
+                for level_clk, level_dt in CW_EDGES[2:]:
+                    clk.drive(level_clk)
+                    dt.drive(level_dt)
+            return steps - rotary.value()
+        result["gate_lost_steps"] = lost(rotary.pause, rotary.resume)
+        result["irq_lost_steps"] = lost(rotary._hal_disable_irq,
+                                        rotary._hal_enable_irq)
+    rotary.close()
+    return result
+
+
+class NullStream:
+    """
+    Discards what is written to it, counting the calls.
+    """
+    def __init__(self):
+        self.writes = 0
+
+    def write(self, data):
+        self.writes += 1
+        return len(data)
+
+
+@bench("logger")
+def bench_logger(ctx):
+    # A log call with the level off, below the level, held back by its
+    # rate limit and queued, the flush per message, and print() of the
+    # same message for comparison
+    null = NullStream()
+    off = Logger(OFF, stream=null)
+    log = Logger(INFO, stream=null)
+    log.limit("limited {}", 1000000)
+    log.info("limited {}", 0)
+    log.sync()
+    msg = "Values = {}, {}"
+
+    def queue_all(count):
+        # Only fills the ring, it is written outside of the timing
+        total = 0
+        for _ in range(count // 16):
+            total += timed(lambda: log.info(msg, 12, 34), 16)
+            log.sync()
+        return total / (count // 16)
+
+    def flush_all(count):
+        total = 0
+        for _ in range(count // 16):
+            for _ in range(16):
+                log.info(msg, 12, 34)
+            total += timed(lambda: log.flush(16), 1) / 16
+        return total / (count // 16)
+    return {
+        "off_us": round(timed(lambda: off.debug(msg, 12, 34), 1000), 2),
+        "below_level_us": round(timed(lambda: log.debug(msg, 12, 34), 1000),
+                                2),
+        "limited_us": round(timed(lambda: log.info("limited {}", 1), 1000),
+                            2),
+        "queued_us": round(queue_all(512), 2),
+        "flush_us": round(flush_all(512), 2),
+        "print_us": round(timed(lambda: print(msg.format(12, 34), file=null),
+                                1000), 2),
+        "dropped": log.dropped,
+    }
+
+
+@bench("async_display_latency")
+def bench_async_latency(ctx):
+    # Encoder change to finished redraw in the event driven runtime. Needs
+    # pins that can be driven, so it only runs on the host, in real time.
+    if ON_DEVICE:
+        return {}
+    import asyncio
+    import main_async
+    fb, r1, r2, button, state = _main_loop_context(ctx)
+    app = main_async.App(fb, r1, r2, button, state)
+    clk = Pin(fox.PIN_R1_CLK)
+    dt = Pin(fox.PIN_R1_DT)
+    steps = 50
+
+    async def drive():
+        task = asyncio.create_task(app.display_task())
+        for _ in range(steps):
+            for level_clk, level_dt in CW_EDGES:
+                clk.value(level_clk)
+                dt.value(level_dt)
+            await asyncio.sleep(0.005)
+        task.cancel()
+
+    utime.set_virtual(False)
+    ctx["i2c"].reset()
+    try:
+        asyncio.run(drive())
+    finally:
+        utime.set_virtual(True)
+    count, average, worst = app.latency_stats()
+    return {
+        "redraws": count,
+        "latency_avg_us": average,
+        "latency_max_us": worst,
+        "bytes_per_redraw": round(ctx["i2c"].bytes / max(count, 1), 1),
+    }
+
+
+@bench("dual_snapshot")
+def bench_dual_snapshot(ctx):
+    # Cost of the sequence lock that hands the encoder results from core 1
+    # to core 0, uncontended
+    import main_dual
+    snapshot = main_dual.Snapshot()
+    out = array('i', bytes(4 * main_dual.SNAPSHOT_SIZE))
+    data = snapshot.data
+
+    def publish():
+        snapshot.begin()
+        data[main_dual.S_VAL1] += 1
+        data[main_dual.S_HALF_TICKS] += 1
+        snapshot.end()
+
+    return {
+        "publish_us": round(timed(publish, 1000), 2),
+        "read_us": round(timed(lambda: snapshot.read(out), 1000), 2),
+    }
+
+
+def load_baseline(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except OSError:
+        return {}
+
+
+def report(results, baseline):
+    for name, metrics in results.items():
+        print(name)
+        old_metrics = baseline.get(name, {})
+        for metric, value in metrics.items():
+            line = "    {:<20} {:>10}".format(metric, value)
+            old = old_metrics.get(metric)
+            if old is not None:
+                delta = ""
+                if old:
+                    delta = " {:+.1f}%".format((value - old) * 100 / old)
+                line += "   baseline {:>10}{}".format(old, delta)
+            print(line)
+
+
+def run(names=None, baseline=BASELINE_FILE, save=False):
+    """
+    Runs the benchmarks and prints them next to the baseline.
+
+    Args:
+        names (list): Only run the benchmarks with these names.
+        baseline (str): Baseline file to compare against, or None.
+        save (bool): Write the results to the baseline file.
+
+    Returns:
+        dict: Metrics per benchmark.
+    """
+    ctx = make_context()
+    results = {}
+    for name, func in _benchmarks:
+        if names and name not in names:
+            continue
+        results[name] = func(ctx)
+    report(results, load_baseline(baseline) if baseline else {})
+    if save and baseline:
+        with open(baseline, 'w') as f:
+            if ON_DEVICE:
+                json.dump(results, f)
+            else:
+                json.dump(results, f, indent=2, sort_keys=True)
+    return results
+
+
+if __name__ == '__main__' and not ON_DEVICE:
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('names', nargs='*', help='benchmarks to run')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save', action='store_true',
+                        help='write the results as the new baseline')
+    args = parser.parse_args()
+    run(args.names, args.baseline, args.save)
@@ -16,7 +16,7 @@ async def heartbeat(lcd):
 event = asyncio.Event()
 
 
-def callback():
+def callback(delta):
     event.set()
 
 
@@ -0,0 +1,95 @@
+"""
+Precompiles the modules in code/ to .mpy bytecode for the Pico.
+
+Importing a .mpy file skips the compile step MicroPython otherwise runs on
+every boot, which takes most of the import time and needs a lot of heap.
+main.py is left as source, since MicroPython only runs main.py; everything
+it imports comes from the .mpy files:
+
+    python host/build_mpy.py [--out build] [--march armv6m]
+    mpremote cp build/*.mpy : + cp code/main.py :
+
+Remove the old .py copies of the other modules from the Pico, MicroPython
+prefers a .py over a .mpy of the same name. Needs mpy-cross matching the
+MicroPython version on the Pico, either the mpy-cross Python package
+(pip install mpy-cross) or the mpy-cross program on PATH.
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+
+HOST_DIR = os.path.dirname(os.path.abspath(__file__))
+CODE_DIR = os.path.join(os.path.dirname(HOST_DIR), 'code')
+OUT_DIR = os.path.join(os.path.dirname(HOST_DIR), 'build')
+MARCH = 'armv6m'            # Cortex-M0+ of the RP2040
+KEEP_SOURCE = ('main.py',)
+
+
+def find_mpy_cross():
+    """
+    Returns the command that runs mpy-cross, or None if it is missing.
+    """
+    try:
+        import mpy_cross
+    except ImportError:
+        pass
+    else:
+        return [sys.executable, '-m', 'mpy_cross']
+    path = shutil.which('mpy-cross')
+    if path:
+        return [path]
+    return None
+
+
+def modules(code_dir=CODE_DIR):
+    """
+    Returns the names of the modules to compile, sorted.
+    """
+    return sorted(name for name in os.listdir(code_dir)
+                  if name.endswith('.py') and name not in KEEP_SOURCE)
+
+
+def build(out_dir=OUT_DIR, march=MARCH, code_dir=CODE_DIR):
+    """
+    Compiles the modules to out_dir.
+
+    Returns:
+        list: Paths of the .mpy files written.
+
+    Raises:
+        RuntimeError: If mpy-cross is missing or fails.
+    """
+    command = find_mpy_cross()
+    if command is None:
+        raise RuntimeError("mpy-cross not found, install it with "
+                           "'pip install mpy-cross' or put it on PATH")
+    os.makedirs(out_dir, exist_ok=True)
+    written = []
+    for name in modules(code_dir):
+        target = os.path.join(out_dir, name[:-3] + '.mpy')
+        result = subprocess.run(command + ['-march=' + march, '-o', target,
+                                           os.path.join(code_dir, name)],
+                                capture_output=True, text=True)
+        if result.returncode:
+            raise RuntimeError("mpy-cross failed on {}:\n{}".format(
+                name, result.stderr))
+        written.append(target)
+    return written
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--out', default=OUT_DIR, help='output directory')
+    parser.add_argument('--march', default=MARCH,
+                        help='target architecture for native code')
+    args = parser.parse_args()
+    try:
+        written = build(args.out, args.march)
+    except RuntimeError as e:
+        sys.exit(str(e))
+    for path in written:
+        print("{:6d}  {}".format(os.path.getsize(path),
+                                 os.path.relpath(path)))
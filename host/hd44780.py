@@ -0,0 +1,242 @@
+"""
+Emulator of an HD44780 character LCD behind a PCF8574 I2C backpack.
+
+It decodes the port bytes I2cLcd writes (RS, RW, E, backlight and the data
+nibble on P4-P7), latches a nibble on every falling edge of E and runs the
+controller's instruction set: the 8-bit reset sequence, 4-bit mode, DDRAM
+and CGRAM writes, entry mode, display control, shifts, clear and home.
+"""
+
+# PCF8574 bit layout, as wired in pico_i2c_lcd.py
+MASK_RS = 0x01
+MASK_RW = 0x02
+MASK_E = 0x04
+SHIFT_BACKLIGHT = 3
+SHIFT_DATA = 4
+
+# Execution time of clear and home; other instructions take less than one
+# I2C byte
+CLEAR_HOME_US = 1520
+
+# DDRAM characters per physical line in two line mode
+LINE_LENGTH = 40
+
+
+class HD44780:
+    def __init__(self, num_lines=2, num_columns=16):
+        self.num_lines = num_lines
+        self.num_columns = num_columns
+        self.ddram = bytearray(b' ' * 128)
+        self.cgram = bytearray(64)
+        # Power-on state: 8-bit interface, one line, display off
+        self.eight_bit = True
+        self.two_lines = False
+        self.font_10 = False
+        self.display_enabled = False
+        self.cursor_enabled = False
+        self.blink_enabled = False
+        self.increment = True
+        self.entry_shift = False
+        self.address = 0
+        self.cgram_mode = False
+        self.display_shift = 0
+        self.backlight = False
+        self._port = 0
+        self._high_nibble = None
+        self._busy_until = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.timeline = []
+        self.transactions = 0
+        self.port_writes = 0
+        self.commands = 0
+        self.data_writes = 0
+        self.clears = 0
+        self.address_sets = 0
+        self.busy_violations = 0
+
+    # I2C device interface
+
+    def write(self, data, t_us=0):
+        self.timeline.append((t_us, data))
+        self.transactions += 1
+        for byte in data:
+            self._write_port(byte, t_us)
+
+    def read(self, nbytes):
+        return bytes([self._port]) * nbytes
+
+    # PCF8574
+
+    def _write_port(self, byte, t_us):
+        self.port_writes += 1
+        previous = self._port
+        self._port = byte
+        self.backlight = bool(byte & (1 << SHIFT_BACKLIGHT))
+        if previous & MASK_E and not byte & MASK_E:
+            # Latched on the falling edge of E with the levels set while high
+            self._latch(previous, t_us)
+
+    # HD44780
+
+    def _latch(self, port, t_us):
+        if port & MASK_RW:
+            return
+        if self._busy_until is not None and t_us < self._busy_until:
+            self.busy_violations += 1
+        self._busy_until = None
+        nibble = (port >> SHIFT_DATA) & 0x0f
+        rs = port & MASK_RS
+        if self.eight_bit:
+            # DB0-DB3 are not wired, so they read as 0
+            self._execute(rs, nibble << 4, t_us)
+        elif self._high_nibble is None:
+            self._high_nibble = nibble
+        else:
+            value = (self._high_nibble << 4) | nibble
+            self._high_nibble = None
+            self._execute(rs, value, t_us)
+
+    def _execute(self, rs, value, t_us):
+        if rs:
+            self.data_writes += 1
+            self._write_data(value)
+            return
+        self.commands += 1
+        if value & 0x80:
+            self.address_sets += 1
+            self.address = value & 0x7f
+            self.cgram_mode = False
+        elif value & 0x40:
+            self.address = value & 0x3f
+            self.cgram_mode = True
+        elif value & 0x20:
+            self.eight_bit = bool(value & 0x10)
+            self.two_lines = bool(value & 0x08)
+            self.font_10 = bool(value & 0x04)
+            self._high_nibble = None
+        elif value & 0x10:
+            step = 1 if value & 0x04 else -1
+            if value & 0x08:
+                self.display_shift += step
+            else:
+                self._step_address(step)
+        elif value & 0x08:
+            self.display_enabled = bool(value & 0x04)
+            self.cursor_enabled = bool(value & 0x02)
+            self.blink_enabled = bool(value & 0x01)
+        elif value & 0x04:
+            self.increment = bool(value & 0x02)
+            self.entry_shift = bool(value & 0x01)
+        elif value & 0x02:
+            self.address = 0
+            self.cgram_mode = False
+            self.display_shift = 0
+            self._busy_until = t_us + CLEAR_HOME_US
+        elif value & 0x01:
+            self.clears += 1
+            for i in range(len(self.ddram)):
+                self.ddram[i] = 0x20
+            self.address = 0
+            self.cgram_mode = False
+            self.increment = True
+            self.display_shift = 0
+            self._busy_until = t_us + CLEAR_HOME_US
+
+    def _write_data(self, value):
+        step = 1 if self.increment else -1
+        if self.cgram_mode:
+            self.cgram[self.address & 0x3f] = value
+            self.address = (self.address + step) & 0x3f
+            return
+        self.ddram[self.address] = value
+        self._step_address(step)
+        if self.entry_shift:
+            self.display_shift += step
+
+    def _step_address(self, step):
+        if self.cgram_mode:
+            self.address = (self.address + step) & 0x3f
+        elif self.two_lines:
+            line = self.address & 0x40
+            pos = (self.address & 0x3f) + step
+            if pos >= LINE_LENGTH:
+                pos = 0
+                line ^= 0x40
+            elif pos < 0:
+                pos = LINE_LENGTH - 1
+                line ^= 0x40
+            self.address = line | pos
+        else:
+            self.address = (self.address + step) % (2 * LINE_LENGTH)
+
+    # Visible state
+
+    def _cell_address(self, x, y):
+        if not self.two_lines:
+            return (x + y * self.num_columns + self.display_shift) % \
+                (2 * LINE_LENGTH)
+        pos = x + (self.num_columns if y & 2 else 0) + self.display_shift
+        return (0x40 if y & 1 else 0) | (pos % LINE_LENGTH)
+
+    def line_bytes(self, y):
+        """
+        Returns the character codes visible on line y.
+        """
+        if not self.display_enabled:
+            return b' ' * self.num_columns
+        return bytes(self.ddram[self._cell_address(x, y)]
+                     for x in range(self.num_columns))
+
+    def lines(self):
+        """
+        Returns the visible screen as a list of strings. CGRAM glyphs
+        (codes 0-7) and other non-ASCII codes show up as '?'.
+        """
+        result = []
+        for y in range(self.num_lines):
+            result.append(''.join(chr(c) if 32 <= c < 127 else '?'
+                                  for c in self.line_bytes(y)))
+        return result
+
+    def text(self):
+        return '\n'.join(self.lines())
+
+    def cursor(self):
+        """
+        Returns the (x, y) cell the address counter points at, or None if
+        it is off screen or in CGRAM.
+        """
+        if self.cgram_mode:
+            return None
+        for y in range(self.num_lines):
+            for x in range(self.num_columns):
+                if self._cell_address(x, y) == self.address:
+                    return (x, y)
+        return None
+
+    def glyph(self, location):
+        """
+        Returns the eight row bitmaps of CGRAM character location.
+        """
+        start = (location & 0x7) * 8
+        return bytes(self.cgram[start:start + 8])
+
+
+if __name__ == '__main__':
+    import hostenv
+    hostenv.install()
+
+    from machine import I2C
+    from pico_i2c_lcd import I2cLcd
+
+    i2c = I2C(1, freq=400000)
+    lcd = I2cLcd(i2c, 0x27, 2, 16)
+    emulator = i2c.device(0x27)
+    emulator.reset_stats()
+    i2c.reset_stats()
+    lcd.putstr("Welcome to Measurement Fox <3")
+    print(emulator.text())
+    print("transactions: {}, bytes: {}, est. bus time: {} us".format(
+        i2c.transactions, i2c.bytes, i2c.bus_time_us))
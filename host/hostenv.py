@@ -0,0 +1,49 @@
+"""
+Sets up CPython so the modules in code/ import and run unchanged.
+
+The stand-in machine, utime and micropython modules in this directory are
+put on sys.path ahead of code/, MicroPython's builtin const() and the
+MicroPython-only helpers of the time module are added, and an emulated
+HD44780 is attached at the LCD address of every new I2C bus.
+"""
+
+import builtins
+import os
+import sys
+import time
+
+HOST_DIR = os.path.dirname(os.path.abspath(__file__))
+CODE_DIR = os.path.join(os.path.dirname(HOST_DIR), 'code')
+
+LCD_ADDR = 0x27
+
+
+def install(lcd_addr=LCD_ADDR, num_lines=2, num_columns=16, virtual_time=False):
+    """
+    Installs the stand-in modules. Safe to call more than once.
+
+    Args:
+        lcd_addr (int): I2C address to attach the emulated LCD to.
+        num_lines (int): Lines of the emulated LCD.
+        num_columns (int): Columns of the emulated LCD.
+        virtual_time (bool): Make utime sleeps advance a virtual clock
+            instead of blocking.
+    """
+    for path in (CODE_DIR, HOST_DIR):
+        if path in sys.path:
+            sys.path.remove(path)
+        sys.path.insert(0, path)
+
+    import micropython
+    import utime
+    import machine
+    from hd44780 import HD44780
+
+    builtins.const = micropython.const
+    for name in ('sleep_ms', 'sleep_us', 'ticks_ms', 'ticks_us',
+                 'ticks_add', 'ticks_diff'):
+        setattr(time, name, getattr(utime, name))
+
+    utime.set_virtual(virtual_time)
+    machine.I2C.default_devices[lcd_addr] = \
+        lambda: HD44780(num_lines, num_columns)
@@ -0,0 +1,213 @@
+"""
+Stand-in for the MicroPython machine module on CPython.
+
+Pins with the same id share one level, like the real GPIOs, and fire their
+IRQ handlers when a host script drives them. I2C buses route writes to
+emulated devices registered in I2C.default_devices (see hostenv.install)
+and keep transaction counters and an estimate of the time spent on the bus.
+Timers fire their callbacks while the script sleeps through utime, at the
+times they are due, in real and in virtual time.
+"""
+
+import micropython
+import utime
+
+# Levels and IRQ handlers per pin id, shared by all Pin objects
+_levels = {}
+_handlers = {}
+
+# Number of IRQ handler invocations, for benchmarks
+irq_calls = 0
+
+
+def _pin_id(pin):
+    if isinstance(pin, Pin):
+        return pin.id
+    return pin
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = _pin_id(id)
+        if self.id not in _levels:
+            _levels[self.id] = 0 if pull == Pin.PULL_DOWN else 1
+        if value is not None:
+            _levels[self.id] = 1 if value else 0
+
+    def value(self, level=None):
+        if level is None:
+            return _levels[self.id]
+        self.drive(level)
+
+    def on(self):
+        self.drive(1)
+
+    def off(self):
+        self.drive(0)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        if handler is None or not trigger:
+            _handlers.pop(self.id, None)
+        else:
+            _handlers[self.id] = (handler, trigger)
+
+    def drive(self, level):
+        """
+        Host only: sets the pin level and fires the IRQ handler on a
+        matching edge, then runs callbacks it scheduled.
+        """
+        global irq_calls
+        level = 1 if level else 0
+        old = _levels[self.id]
+        _levels[self.id] = level
+        if old == level:
+            return
+        entry = _handlers.get(self.id)
+        if entry is None:
+            return
+        handler, trigger = entry
+        if trigger & (Pin.IRQ_RISING if level else Pin.IRQ_FALLING):
+            irq_calls += 1
+            handler(self)
+            micropython.run_scheduled()
+
+
+def disable_irq():
+    return 0
+
+
+def enable_irq(state=0):
+    pass
+
+
+def freq(hz=None):
+    return 125000000
+
+
+def reset_pins():
+    """
+    Host only: forgets all pin levels and handlers.
+    """
+    _levels.clear()
+    _handlers.clear()
+
+
+class I2C:
+    # Address -> factory for the devices every new bus starts with
+    default_devices = {}
+
+    def __init__(self, id=0, scl=None, sda=None, freq=400000, timeout=50000):
+        self.id = id
+        self.freq = freq
+        self._devices = {}
+        for addr, factory in I2C.default_devices.items():
+            self._devices[addr] = factory()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.transactions = 0
+        self.bytes = 0
+        self.bus_time_us = 0
+
+    def attach(self, addr, device):
+        self._devices[addr] = device
+
+    def device(self, addr):
+        return self._devices[addr]
+
+    def scan(self):
+        return sorted(self._devices)
+
+    def transfer_time_us(self, nbytes):
+        """
+        Estimated duration of one write of nbytes: start, address byte,
+        data bytes with their ACK bits, and stop.
+        """
+        return ((nbytes + 1) * 9 + 2) * 1000000 // self.freq
+
+    def writeto(self, addr, buf, stop=True):
+        device = self._devices.get(addr)
+        if device is None:
+            raise OSError(5)  # EIO, no ACK from the address
+        data = bytes(buf)
+        timestamp = utime.ticks_us()
+        duration = self.transfer_time_us(len(data))
+        self.transactions += 1
+        self.bytes += len(data)
+        self.bus_time_us += duration
+        utime.advance_us(duration)
+        device.write(data, timestamp)
+        return len(data)
+
+    def readfrom(self, addr, nbytes, stop=True):
+        device = self._devices.get(addr)
+        if device is None:
+            raise OSError(5)
+        return device.read(nbytes)
+
+
+# Running machine.Timer instances
+_timers = []
+
+
+def _sleep_with_timers(us, sleep):
+    # utime sleep hook: sleeps up to each due timer and fires it
+    end = utime.ticks_add(utime.ticks_us(), int(us))
+    while True:
+        due = None
+        for timer in _timers:
+            if (utime.ticks_diff(timer._deadline, end) <= 0 and
+                    (due is None or
+                     utime.ticks_diff(timer._deadline, due._deadline) < 0)):
+                due = timer
+        if due is None:
+            break
+        sleep(max(0, utime.ticks_diff(due._deadline, utime.ticks_us())))
+        due._fire()
+    sleep(max(0, utime.ticks_diff(end, utime.ticks_us())))
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, mode=PERIODIC, period=-1, callback=None,
+                 freq=-1):
+        self._deadline = 0
+        if callback is not None:
+            self.init(mode=mode, period=period, callback=callback, freq=freq)
+
+    def init(self, mode=PERIODIC, period=-1, callback=None, freq=-1):
+        if freq > 0:
+            period = 1000 / freq
+        self.mode = mode
+        self._period_us = int(period * 1000)
+        self.callback = callback
+        self._deadline = utime.ticks_add(utime.ticks_us(), self._period_us)
+        if self not in _timers:
+            _timers.append(self)
+        utime.set_sleep_hook(_sleep_with_timers)
+
+    def deinit(self):
+        if self in _timers:
+            _timers.remove(self)
+
+    def _fire(self):
+        if self.mode == Timer.PERIODIC:
+            self._deadline = utime.ticks_add(self._deadline, self._period_us)
+            if utime.ticks_diff(self._deadline, utime.ticks_us()) < 0:
+                # Fell behind, e.g. a long callback: skip the missed ones
+                self._deadline = utime.ticks_add(utime.ticks_us(),
+                                                 self._period_us)
+        else:
+            self.deinit()
+        self.callback(self)
+        micropython.run_scheduled()
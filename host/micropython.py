@@ -0,0 +1,51 @@
+"""
+Stand-in for the MicroPython micropython module on CPython.
+
+Code generation decorators are no-ops. schedule() queues callbacks like the
+firmware does and the queue is drained by run_scheduled(), which the
+stand-in machine.Pin calls after each interrupt handler returns.
+"""
+
+SCHEDULE_QUEUE_SIZE = 8
+
+_queue = []
+
+
+def const(value):
+    return value
+
+
+def native(func):
+    return func
+
+
+def viper(func):
+    return func
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def schedule(func, arg):
+    """
+    Queues func(arg) to run outside interrupt context.
+
+    Raises:
+        RuntimeError: When the queue is full, as on the device.
+    """
+    if len(_queue) >= SCHEDULE_QUEUE_SIZE:
+        raise RuntimeError("schedule queue full")
+    _queue.append((func, arg))
+
+
+def run_scheduled():
+    """
+    Runs all pending scheduled callbacks. Returns how many ran.
+    """
+    count = 0
+    while _queue:
+        func, arg = _queue.pop(0)
+        func(arg)
+        count += 1
+    return count
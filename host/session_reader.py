@@ -0,0 +1,143 @@
+"""
+Reads session recordings made by code/recorder.py on the host.
+
+Files are streamed a chunk at a time, so they can be larger than memory:
+records() yields one tuple per record, numpy_blocks() yields NumPy
+structured arrays for fast processing of big files, and to_csv() exports a
+plain CSV file.
+
+    python host/session_reader.py session0.bin
+    python host/session_reader.py session0.bin --csv session0.csv
+"""
+
+import struct
+import sys
+
+# The file format written by code/recorder.py, repeated here so the reader
+# runs on a plain CPython without the MicroPython stand-ins. read_header()
+# rejects files of any other version.
+MAGIC = b"FOXS"
+VERSION = 1
+HEADER_FORMAT = '<4sHHI'    # magic, version, record size, block records
+HEADER_SIZE = 12
+FIELDS = 4
+SAMPLE = 0
+EVENT = 1
+
+KIND_NAMES = {SAMPLE: 'sample', EVENT: 'event'}
+CHUNK_RECORDS = 4096
+CSV_HEADER = 'time_ms,val1,val2,kind,arg'
+
+
+def read_header(f):
+    """
+    Reads and checks the header of a session file.
+
+    Returns:
+        int: The record size in bytes.
+
+    Raises:
+        ValueError: If f is not a session file of a known version.
+    """
+    header = f.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE:
+        raise ValueError("not a session file: too short")
+    magic, version, record_size, _ = struct.unpack(HEADER_FORMAT, header)
+    if magic != MAGIC:
+        raise ValueError("not a session file: bad magic {!r}".format(magic))
+    if version != VERSION or record_size != 4 * FIELDS:
+        raise ValueError("unsupported session version {} with {} byte "
+                         "records".format(version, record_size))
+    return record_size
+
+
+def records(path, chunk_records=CHUNK_RECORDS):
+    """
+    Yields (time_ms, val1, val2, kind, arg) for each record of a session
+    file. A torn record at the end is ignored.
+    """
+    with open(path, 'rb') as f:
+        record_size = read_header(f)
+        record = struct.Struct('<%di' % FIELDS)
+        while True:
+            chunk = f.read(record_size * chunk_records)
+            usable = len(chunk) - len(chunk) % record_size
+            for time_ms, val1, val2, tag in record.iter_unpack(chunk[:usable]):
+                yield time_ms, val1, val2, tag >> 8, tag & 0xff
+            if len(chunk) < record_size * chunk_records:
+                return
+
+
+def numpy_dtype():
+    import numpy as np
+    return np.dtype([('time_ms', '<i4'), ('val1', '<i4'), ('val2', '<i4'),
+                     ('tag', '<i4')])
+
+
+def numpy_blocks(path, chunk_records=CHUNK_RECORDS * 64):
+    """
+    Yields the records of a session file as NumPy structured arrays of at
+    most chunk_records records, with fields time_ms, val1, val2 and tag
+    (kind is tag >> 8, arg is tag & 0xff). Needs NumPy.
+    """
+    import numpy as np
+    dtype = numpy_dtype()
+    with open(path, 'rb') as f:
+        read_header(f)
+        while True:
+            block = np.fromfile(f, dtype=dtype, count=chunk_records)
+            if len(block):
+                yield block
+            if len(block) < chunk_records:
+                return
+
+
+def read_numpy(path):
+    """
+    Returns a whole session file as one NumPy structured array.
+    """
+    import numpy as np
+    blocks = list(numpy_blocks(path))
+    if not blocks:
+        return np.empty(0, dtype=numpy_dtype())
+    return np.concatenate(blocks)
+
+
+def to_csv(path, out):
+    """
+    Writes a session file as CSV to the file object out.
+
+    Returns:
+        int: Number of records written.
+    """
+    out.write(CSV_HEADER + '\n')
+    count = 0
+    for time_ms, val1, val2, kind, arg in records(path):
+        out.write('{},{},{},{},{}\n'.format(
+            time_ms, val1, val2, KIND_NAMES.get(kind, kind), arg))
+        count += 1
+    return count
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('path', help='session file')
+    parser.add_argument('--csv', help='write CSV to this file, - for stdout')
+    args = parser.parse_args()
+    if args.csv == '-':
+        to_csv(args.path, sys.stdout)
+    elif args.csv:
+        with open(args.csv, 'w') as out:
+            print("{} records".format(to_csv(args.path, out)))
+    else:
+        count = 0
+        events = 0
+        last = None
+        for record in records(args.path):
+            count += 1
+            events += record[3] == EVENT
+            last = record
+        print("{} records, {} button events".format(count, events))
+        if last is not None:
+            print("last: {} ms, values {}, {}".format(*last[:3]))
@@ -0,0 +1,104 @@
+"""
+Stand-in for the MicroPython utime module on CPython.
+
+Ticks wrap around like on the Pico, so code that forgets ticks_diff()
+breaks here too. In virtual mode the sleep functions advance the clock
+instead of blocking, which lets long scripted sessions run instantly while
+still accounting for the time the device would have spent sleeping.
+"""
+
+import time as _time
+
+_TICKS_PERIOD = 1 << 30
+_TICKS_MAX = _TICKS_PERIOD - 1
+_TICKS_HALFPERIOD = _TICKS_PERIOD // 2
+
+_virtual = False
+_offset_us = 0
+_sleep_hook = None
+
+
+def set_virtual(enabled):
+    """
+    Switches between real sleeping and virtual (non-blocking) sleeping.
+
+    Args:
+        enabled (bool): True to make the sleep functions advance the clock.
+    """
+    global _virtual
+    _virtual = enabled
+
+
+def is_virtual():
+    return _virtual
+
+
+def advance_us(us):
+    """
+    Moves the clock forward without sleeping. Used by the stand-in drivers
+    to account for bus time in virtual mode; a no-op in real mode.
+    """
+    global _offset_us
+    if _virtual:
+        _offset_us += int(us)
+
+
+def _now_us():
+    return _time.perf_counter_ns() // 1000 + _offset_us
+
+
+def ticks_us():
+    return _now_us() & _TICKS_MAX
+
+
+def ticks_ms():
+    return (_now_us() // 1000) & _TICKS_MAX
+
+
+def ticks_cpu():
+    return ticks_us()
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & _TICKS_MAX
+
+
+def ticks_diff(ticks1, ticks2):
+    return ((ticks1 - ticks2 + _TICKS_HALFPERIOD) & _TICKS_MAX) - _TICKS_HALFPERIOD
+
+
+def time():
+    return int(_time.time() + _offset_us // 1000000)
+
+
+def set_sleep_hook(hook):
+    """
+    Host only: makes the sleep functions call hook(us, sleep) instead of
+    sleeping, where sleep(us) is the plain sleep. machine.Timer uses this
+    to fire its callbacks while the script sleeps.
+    """
+    global _sleep_hook
+    _sleep_hook = hook
+
+
+def _sleep(us):
+    global _offset_us
+    if _virtual:
+        _offset_us += int(us)
+    elif us > 0:
+        _time.sleep(us / 1000000)
+
+
+def sleep_us(us):
+    if _sleep_hook is not None:
+        _sleep_hook(us, _sleep)
+    else:
+        _sleep(us)
+
+
+def sleep_ms(ms):
+    sleep_us(ms * 1000)
+
+
+def sleep(seconds):
+    sleep_us(seconds * 1000000)